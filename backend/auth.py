@@ -1,11 +1,18 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from . import models, database
+from . import models, database, response_cache
+from .cache import TTLCache
 
 # Configuración de seguridad
 import os
@@ -13,24 +20,229 @@ SECRET_KEY = os.getenv("SECRET_KEY", "agente-financeiro-secret-key-change-in-pro
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 horas
 
-# Contexto para hash de contraseñas
 # Contexto para hash de contraseñas
 # Usando pbkdf2_sha256 por compatibilidad (Windows/Linux) y evitando errores de DLL de bcrypt
-pwd_context = CryptContext(schemes=["pbkdf2_sha256", "bcrypt"], deprecated="auto")
+# Perfil de custo (rounds do pbkdf2_sha256). Hashes abaixo do perfil ou em esquema
+# obsoleto (bcrypt) são refeitos no próximo login. Medir: python -m backend.bench_hashing
+PASSWORD_HASH_PROFILES = {
+    "low": 29000,      # padrão do passlib 1.7 (hashes atuais)
+    "medium": 150000,
+    "high": 600000,    # recomendação OWASP 2023 para PBKDF2-HMAC-SHA256
+}
+PASSWORD_HASH_PROFILE = os.getenv("PASSWORD_HASH_PROFILE", "low")
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "0")) or PASSWORD_HASH_PROFILES.get(
+    PASSWORD_HASH_PROFILE, PASSWORD_HASH_PROFILES["low"]
+)
+
+
+def build_pwd_context(rounds: int) -> CryptContext:
+    return CryptContext(
+        schemes=["pbkdf2_sha256", "bcrypt"],
+        deprecated="auto",
+        pbkdf2_sha256__default_rounds=rounds,
+        pbkdf2_sha256__min_rounds=rounds,
+    )
+
+
+pwd_context = build_pwd_context(PASSWORD_HASH_ROUNDS)
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 
+class CurrentUser:
+    """Identidade do usuário autenticado (snapshot, sem sessão de banco)"""
+    __slots__ = ("id", "username", "role", "parent_id", "is_active", "token_exp")
+
+    def __init__(self, id: int, username: str, role: str, parent_id: Optional[int], is_active: bool, token_exp: float):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.parent_id = parent_id
+        self.is_active = is_active
+        self.token_exp = token_exp
+
+
+# Cache token -> (versão de usuários, CurrentUser): evita o decode do JWT e o
+# SELECT em users a cada requisição. Mudanças de role/is_active/parent_id e
+# exclusões incrementam response_cache.USERS_FAMILY no mesmo commit; a versão é
+# lida uma vez por requisição (response_cache.versions, a mesma leitura que o
+# escopo familiar e o cache de respostas reutilizam) e entradas de outra versão
+# são descartadas em qualquer worker. O TTL só limita a memória.
+_identity_cache = TTLCache(
+    maxsize=int(os.getenv("AUTH_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL", "60")),
+)
+
+
+# ============ HASHING FORA DO PROCESSO DA API ============
+
+# pbkdf2/bcrypt são caros de propósito: o hash roda em um pool de processos
+# limitado, liberando o GIL do worker enquanto a thread da requisição espera.
+# HASH_POOL_SIZE=0 executa no próprio processo (scripts, testes).
+# No máximo HASH_MAX_IN_FLIGHT hashes por worker ao mesmo tempo: os demais
+# esperam a vez (fila), em vez de acumular trabalho sem limite no pool.
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", str(min(2, os.cpu_count() or 1))))
+HASH_MAX_IN_FLIGHT = int(os.getenv("HASH_MAX_IN_FLIGHT", "0")) or max(HASH_POOL_SIZE, 1) * 2
+# Tentativas de login por (IP, usuário) na janela (0 = sem limite)
+LOGIN_MAX_ATTEMPTS = int(os.getenv("LOGIN_MAX_ATTEMPTS", "10"))
+LOGIN_WINDOW_SECONDS = float(os.getenv("LOGIN_WINDOW_SECONDS", "60"))
+
+_hash_pool = None
+_hash_pool_pid = None
+_hash_pool_lock = threading.Lock()
+_hash_slots = threading.BoundedSemaphore(HASH_MAX_IN_FLIGHT)
+
+
+def _get_hash_pool():
+    """Pool do processo atual (cada worker tem o seu, criado em start_hash_pool).
+    Fora da API (scripts) é criado no primeiro uso."""
+    global _hash_pool, _hash_pool_pid
+    if HASH_POOL_SIZE <= 0:
+        return None
+    with _hash_pool_lock:
+        if _hash_pool is None or _hash_pool_pid != os.getpid():
+            _hash_pool = ProcessPoolExecutor(max_workers=HASH_POOL_SIZE)
+            _hash_pool_pid = os.getpid()
+        return _hash_pool
+
+
+def start_hash_pool():
+    """Cria o pool do worker no início do lifespan e já inicia os processos.
+
+    O executor só faz o fork dos processos no primeiro submit: feito aqui, antes
+    das threads da API existirem, nenhum filho herda um lock preso por outra thread.
+    """
+    pool = _get_hash_pool()
+    if pool is not None:
+        pool.submit(int).result()
+
+
+def shutdown_hash_pool():
+    """Encerra o pool de hash do worker (fim do lifespan)"""
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is not None and _hash_pool_pid == os.getpid():
+            _hash_pool.shutdown(wait=True, cancel_futures=True)
+        _hash_pool = None
+
+
+class HashMetrics:
+    """Latência das operações de hash (inclui espera na fila do pool)"""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.in_flight = 0
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+        return time.perf_counter()
+
+    def stop(self, started: float):
+        ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.in_flight -= 1
+            self.count += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+            self._recent.append(ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            def pct(p):
+                return round(recent[min(len(recent) - 1, int(len(recent) * p))], 2) if recent else 0
+            return {
+                "profile": PASSWORD_HASH_PROFILE,
+                "rounds": PASSWORD_HASH_ROUNDS,
+                "pool_size": HASH_POOL_SIZE,
+                "max_in_flight": HASH_MAX_IN_FLIGHT,
+                "count": self.count,
+                "in_flight": self.in_flight,
+                "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0,
+                "p50_ms": pct(0.50),
+                "p95_ms": pct(0.95),
+                "max_ms": round(self.max_ms, 2),
+            }
+
+
+hash_metrics = HashMetrics()
+
+
+def _run_hashing(fn, *args):
+    started = hash_metrics.start()
+    try:
+        with _hash_slots:
+            pool = _get_hash_pool()
+            if pool is None:
+                return fn(*args)
+            return pool.submit(fn, *args).result()
+    finally:
+        hash_metrics.stop(started)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password[:72], hashed_password)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str):
+    return pwd_context.verify_and_update(plain_password[:72], hashed_password)
+
+
+def _hash(password: str) -> str:
+    # Bcrypt limit is 72 bytes
+    return pwd_context.hash(password[:72])
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verificar contraseña contra hash"""
-    return pwd_context.verify(plain_password[:72], hashed_password)
+    return _run_hashing(_verify, plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """Crear hash de contraseña"""
-    # Bcrypt limit is 72 bytes
-    return pwd_context.hash(password[:72])
+    return _run_hashing(_hash, password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    """Verificar contraseña; retorna (válida, novo_hash ou None se o hash já está no perfil)"""
+    return _run_hashing(_verify_and_update, plain_password, hashed_password)
+
+
+class LoginRateLimiter:
+    """Tentativas de login por chave (IP, usuário) numa janela deslizante, por processo.
+
+    Uma chave esgotada não afeta as outras: excesso de tentativas contra uma
+    conta não bloqueia o login dos demais usuários.
+    """
+
+    def __init__(self, max_attempts: int, window: float, maxsize: int = 10000):
+        self.max_attempts = max_attempts
+        self.window = window
+        self._hits = TTLCache(maxsize=maxsize, ttl=window)  # chave -> deque de instantes
+        self._lock = threading.Lock()
+
+    def allow(self, key) -> bool:
+        if self.max_attempts <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key) or deque()
+            while hits and now - hits[0] >= self.window:
+                hits.popleft()
+            if len(hits) >= self.max_attempts:
+                return False
+            hits.append(now)
+            self._hits.set(key, hits)
+            return True
+
+
+login_limiter = LoginRateLimiter(LOGIN_MAX_ATTEMPTS, LOGIN_WINDOW_SECONDS)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -45,19 +257,13 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-def get_db():
-    """Dependencia para obtener sesión de base de datos"""
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+get_db = database.get_db
 
 
 async def get_current_user(
     token: Optional[str] = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> Optional[models.User]:
+    db: AsyncSession = Depends(database.get_async_db)
+) -> Optional[CurrentUser]:
     """Obtener usuario actual desde el token JWT"""
     if not token:
         return None
@@ -68,17 +274,38 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
+    entrada = _identity_cache.get(token)
+    # Com a identidade em cache, a versão da família vem na mesma consulta
+    familia = (entrada[1].parent_id or entrada[1].id) if entrada else None
+    versao = (await db.run_sync(response_cache.versions, familia))[response_cache.USERS_FAMILY]
+    user = entrada[1] if entrada and entrada[0] == versao else None
+    if user is not None and user.token_exp <= time.time():
+        _identity_cache.pop(token)
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.username == username).first()
     if user is None:
-        raise credentials_exception
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+        except JWTError:
+            raise credentials_exception
+        
+        result = await db.execute(select(models.User).where(models.User.username == username))
+        db_user = result.scalars().first()
+        if db_user is None:
+            raise credentials_exception
+        
+        user = CurrentUser(
+            id=db_user.id,
+            username=db_user.username,
+            role=db_user.role,
+            parent_id=db_user.parent_id,
+            is_active=db_user.is_active,
+            token_exp=float(payload.get("exp") or 0)
+        )
+        _identity_cache.set(token, (versao, user))
     
     if not user.is_active:
         raise HTTPException(
@@ -90,8 +317,8 @@ async def get_current_user(
 
 
 async def get_current_user_required(
-    current_user: Optional[models.User] = Depends(get_current_user)
-) -> models.User:
+    current_user: Optional[CurrentUser] = Depends(get_current_user)
+) -> CurrentUser:
     """Requerir usuario autenticado"""
     if current_user is None:
         raise HTTPException(
@@ -103,8 +330,8 @@ async def get_current_user_required(
 
 
 async def require_admin(
-    current_user: models.User = Depends(get_current_user_required)
-) -> models.User:
+    current_user: CurrentUser = Depends(get_current_user_required)
+) -> CurrentUser:
     """Requerir que el usuario sea administrador (Padre)"""
     if current_user.role != "admin":
         raise HTTPException(
@@ -115,8 +342,8 @@ async def require_admin(
 
 
 async def require_any_admin(
-    current_user: models.User = Depends(get_current_user_required)
-) -> models.User:
+    current_user: CurrentUser = Depends(get_current_user_required)
+) -> CurrentUser:
     """Requerir que sea admin o subadmin"""
     if current_user.role not in ["admin", "subadmin"]:
         raise HTTPException(
@@ -131,10 +358,16 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[mod
     user = db.query(models.User).filter(models.User.username == username).first()
     if not user:
         return None
-    if not verify_password(password, user.password_hash):
+    valid, new_hash = verify_and_update_password(password, user.password_hash)
+    if not valid:
         return None
     if not user.is_active:
         return None
+    if new_hash:
+        # Hash obsoleto ou abaixo do perfil de custo: regravar com o perfil atual
+        user.password_hash = new_hash
+        db.commit()
+        db.refresh(user)
     return user
 
 
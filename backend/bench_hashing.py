@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos perfis de custo de hash de senha (auth.PASSWORD_HASH_PROFILES).
+
+Mede hashes por segundo em um único processo (= por núcleo) para cada
+perfil e estima a capacidade de login do pool configurado
+(HASH_POOL_SIZE processos; cada login faz uma verificação).
+
+    python -m backend.bench_hashing
+    python -m backend.bench_hashing --seconds 5 --profiles low high
+"""
+
+import argparse
+import os
+import time
+
+from .auth import PASSWORD_HASH_PROFILES, HASH_POOL_SIZE, build_pwd_context
+
+
+def hashes_per_second(rounds: int, seconds: float) -> float:
+    ctx = build_pwd_context(rounds)
+    # aquecimento
+    ctx.hash("senha-de-teste")
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        ctx.hash("senha-de-teste")
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=2.0, help="duração da medição por perfil")
+    parser.add_argument("--profiles", nargs="*", default=list(PASSWORD_HASH_PROFILES))
+    args = parser.parse_args()
+
+    pool = max(HASH_POOL_SIZE, 1)
+    print(f"[bench] CPUs: {os.cpu_count()} | HASH_POOL_SIZE: {HASH_POOL_SIZE}")
+    print(f"{'perfil':<8} {'rounds':>8} {'hash/s/núcleo':>14} {'ms/hash':>9} {'logins/s (pool)':>16}")
+    for name in args.profiles:
+        rounds = PASSWORD_HASH_PROFILES[name]
+        rate = hashes_per_second(rounds, args.seconds)
+        print(f"{name:<8} {rounds:>8} {rate:>14.1f} {1000 / rate:>9.2f} {rate * pool:>16.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos índices compostos de transações (antes/depois).
+
+Cria um banco SQLite temporário com N transações, roda as consultas
+analíticas da API com os índices antigos (colunas simples), aplica o
+conjunto de backend/migrate_indexes.py e roda de novo, mostrando o
+plano de execução (EXPLAIN QUERY PLAN) e o tempo de cada consulta.
+
+    python -m backend.bench_indexes              # 1.000.000 linhas
+    python -m backend.bench_indexes --rows 200000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+try:
+    from .migrate_indexes import create_indexes
+except ImportError:
+    from migrate_indexes import create_indexes
+
+CATEGORIAS = ["Alimentación", "Transporte", "Vivienda", "Entretenimiento", "Salud", "Educación", "Servicios", "Otros"]
+
+# Mesmo schema de models.Transaction, só com os índices de coluna simples
+SCHEMA = """
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY,
+    description VARCHAR,
+    amount FLOAT,
+    type VARCHAR,
+    category VARCHAR,
+    date DATE,
+    user_id INTEGER NOT NULL,
+    is_recurring BOOLEAN,
+    recurrence_day INTEGER,
+    recurrence_active BOOLEAN
+);
+CREATE INDEX ix_transactions_description ON transactions (description);
+CREATE INDEX ix_transactions_category ON transactions (category);
+CREATE INDEX ix_transactions_user_id ON transactions (user_id);
+"""
+
+
+def seed(conn, rows, families):
+    """Famílias de 3 usuários (pai + 2 dependentes), ~10 anos de histórico"""
+    inicio = date.today() - timedelta(days=3650)
+    rnd = random.Random(42)
+    batch = []
+    for i in range(rows):
+        user_id = rnd.randrange(families * 3) + 1
+        tipo = "income" if rnd.random() < 0.2 else "expense"
+        batch.append((
+            f"Movimiento {rnd.randrange(5000)}",
+            round(rnd.uniform(1000, 500000), 2),
+            tipo,
+            rnd.choice(CATEGORIAS),
+            (inicio + timedelta(days=rnd.randrange(3650))).isoformat(),
+            user_id,
+        ))
+        if len(batch) == 50000:
+            conn.executemany(
+                "INSERT INTO transactions (description, amount, type, category, date, user_id, is_recurring, recurrence_active) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0, 1)", batch)
+            batch = []
+    if batch:
+        conn.executemany(
+            "INSERT INTO transactions (description, amount, type, category, date, user_id, is_recurring, recurrence_active) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0, 1)", batch)
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def queries():
+    hoje = date.today()
+    inicio_mes = date(hoje.year, hoje.month, 1).isoformat()
+    familia = (1, 2, 3)
+    return [
+        ("analytics (mês, família)",
+         "SELECT type, category, SUM(amount), COUNT(id) FROM transactions "
+         "WHERE user_id IN (?, ?, ?) AND date >= ? AND date <= ? GROUP BY type, category",
+         familia + (inicio_mes, hoje.isoformat())),
+        ("relatório (1 ano, família)",
+         "SELECT date, type, category, amount FROM transactions "
+         "WHERE user_id IN (?, ?, ?) AND date >= ? AND date <= ?",
+         familia + ((hoje - timedelta(days=365)).isoformat(), hoje.isoformat())),
+        ("status de orçamento",
+         "SELECT category, SUM(amount) FROM transactions "
+         "WHERE user_id = ? AND category IN (?, ?) AND type = 'expense' AND date >= ? AND date <= ? "
+         "GROUP BY category",
+         (1, "Transporte", "Salud", inicio_mes, hoje.isoformat())),
+        ("listagem (últimas 100)",
+         "SELECT * FROM transactions WHERE user_id IN (?, ?, ?) ORDER BY date DESC LIMIT 100",
+         familia),
+    ]
+
+
+def run(conn, titulo, repeat):
+    print(f"\n=== {titulo} ===")
+    for nome, sql, params in queries():
+        plano = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, params).fetchall()
+        ms = (time.perf_counter() - t0) * 1000 / repeat
+        print(f"- {nome}: {ms:.2f} ms")
+        for row in plano:
+            print(f"    {row[-1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--families", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    print(f"[bench] Populando {args.rows} transações em {path}...")
+    seed(conn, args.rows, args.families)
+
+    run(conn, "ANTES (índices simples)", args.repeat)
+    create_indexes(conn)
+    run(conn, "DEPOIS (índices compostos)", args.repeat)
+
+    conn.close()
+    os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,380 @@
+import os
+from decimal import Decimal
+from types import SimpleNamespace
+from sqlalchemy import insert, or_
 from sqlalchemy.orm import Session
-from . import models, schemas
+from . import models, schemas, database, fts, fx, response_cache
+from .cache import TTLCache
+
+
+# ============ ESCOPO FAMILIAR ============
+
+# IDs visíveis e raiz da família por usuário, guardados com a versão de
+# usuários (response_cache.USERS_FAMILY) em que foram lidos. As escritas de
+# usuários incrementam essa versão no mesmo commit; cada requisição lê a
+# versão uma vez (response_cache.versions) e descarta entradas de outra versão,
+# então nenhum worker usa um escopo anterior à escrita. No próprio processo
+# invalidate_family_scope limpa tudo na hora.
+_family_scope_cache = TTLCache(
+    maxsize=int(os.getenv("FAMILY_SCOPE_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("FAMILY_SCOPE_CACHE_TTL", "300")),
+)
+
+
+_family_root_cache = TTLCache(
+    maxsize=int(os.getenv("FAMILY_SCOPE_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("FAMILY_SCOPE_CACHE_TTL", "300")),
+)
+
+
+def invalidate_family_scope():
+    """Limpa o cache de escopo familiar (mudança de parent_id/role)"""
+    _family_scope_cache.clear()
+    _family_root_cache.clear()
+
+
+def get_family_root(db: Session, user_id: int) -> int:
+    """ID do usuário raiz da família (o pai; o próprio usuário se não tiver parent_id)"""
+    versao = response_cache.versions(db)[response_cache.USERS_FAMILY]
+    entrada = _family_root_cache.get(user_id)
+    if entrada is not None and entrada[0] == versao:
+        return entrada[1]
+    root = db.query(models.User.parent_id).filter(models.User.id == user_id).scalar() or user_id
+    _family_root_cache.set(user_id, (versao, root))
+    return root
+
+
+def touch_families(db: Session, user_ids):
+    """Invalida o cache de respostas das famílias dos usuários (sem commit: vai junto com a escrita)"""
+    response_cache.bump(db, {get_family_root(db, uid) for uid in user_ids})
+
+
+def get_family_user_ids(db: Session, user_id: int) -> frozenset:
+    """IDs de usuários cujas transações o usuário pode ver.
+
+    - Pai/admin (sem parent_id): ele mesmo + dependentes
+    - Subadmin: o pai da família + todos os dependentes (inclusive ele)
+    - Dependente comum: apenas ele mesmo
+    """
+    versao = response_cache.versions(db)[response_cache.USERS_FAMILY]
+    entrada = _family_scope_cache.get(user_id)
+    if entrada is not None and entrada[0] == versao:
+        return entrada[1]
+
+    # Uma única consulta traz o usuário, seus filhos, o pai e os irmãos
+    parent_id_subq = db.query(models.User.parent_id).filter(models.User.id == user_id).scalar_subquery()
+    rows = db.query(models.User.id, models.User.parent_id, models.User.role).filter(
+        or_(
+            models.User.id == user_id,
+            models.User.parent_id == user_id,
+            models.User.id == parent_id_subq,
+            models.User.parent_id == parent_id_subq,
+        )
+    ).all()
+
+    me = next((r for r in rows if r.id == user_id), None)
+    if me is None:
+        user_ids = frozenset([user_id])
+    elif not me.parent_id:
+        user_ids = frozenset([user_id] + [r.id for r in rows if r.parent_id == user_id])
+    elif me.role == "subadmin":
+        user_ids = frozenset([me.parent_id] + [r.id for r in rows if r.parent_id == me.parent_id])
+    else:
+        user_ids = frozenset([user_id])
+
+    _family_scope_cache.set(user_id, (versao, user_ids))
+    return user_ids
+
+
+# ============ MOEDA ============
+
+def get_user_currency(db: Session, user_id: int) -> str:
+    """Moeda do usuário (padrão fx.DEFAULT_CURRENCY)"""
+    moeda = db.query(models.User.currency).filter(models.User.id == user_id).scalar()
+    return fx.normalize_currency(moeda) or fx.DEFAULT_CURRENCY
+
+
+def _local_currency_filter(column, moeda: str):
+    """Linhas já na moeda de destino (NULL = moeda de quem consulta)"""
+    return or_(column == moeda, column.is_(None))
+
+
+def _foreign_totals(db: Session, chaves: list, filtros: list, moeda: str, sem_cotacao: set = None) -> list:
+    """Linhas (*chaves, total, quantidade) das transações em outras moedas, convertidas para moeda.
+
+    O banco agrupa por (*chaves, currency, date) e cada grupo é convertido com a
+    cotação do dia: o trabalho em Python cresce com os dias/moedas distintos,
+    não com o número de transações. Moedas sem cotação: ver fx.convert_totals.
+    """
+    from sqlalchemy import func
+
+    T = models.Transaction
+    rows = db.query(
+        *chaves, T.currency, T.date, func.coalesce(func.sum(T.amount), 0), func.count(T.id)
+    ).filter(*filtros, T.currency != moeda).group_by(*chaves, T.currency, T.date).all()
+    if not rows:
+        return []
+
+    n = len(chaves)
+    convertidos = fx.convert_totals(db, [(r[n], r[n + 1], r[n + 2]) for r in rows], moeda, sem_cotacao)
+    acumulado = {}
+    for r, total in zip(rows, convertidos):
+        item = acumulado.setdefault(tuple(r[:n]), [Decimal("0.00"), 0])
+        item[0] += total
+        item[1] += r[n + 3]
+    return [chave + tuple(v) for chave, v in acumulado.items()]
+
+
+def _merge_totals(*grupos) -> list:
+    """Soma listas de linhas (*chaves, total, quantidade) pelas chaves"""
+    acumulado = {}
+    for linhas in grupos:
+        for *chave, total, quantidade in linhas:
+            item = acumulado.setdefault(tuple(chave), [0, 0])
+            item[0] += total
+            item[1] += quantidade
+    return [chave + tuple(v) for chave, v in acumulado.items()]
+
+
+# ============ ROLLUPS MENSAIS ============
+
+def _rollup_key(transacao):
+    """Chave (user_id, "YYYY-MM", type, category, currency) do rollup de uma transação"""
+    return (transacao.user_id, transacao.date.strftime("%Y-%m"), transacao.type, transacao.category,
+            transacao.currency)
+
+
+def _rollup_delta(deltas: dict, transacao, sinal: int = 1):
+    """Acumula em deltas a contribuição (+/-) de uma transação"""
+    delta = deltas.setdefault(_rollup_key(transacao), [0, 0])
+    delta[0] += sinal * models.as_money(transacao.amount)
+    delta[1] += sinal
+
+
+def _apply_rollup_deltas(db: Session, deltas: dict):
+    """Aplica deltas {chave: [total, count]} em monthly_rollups, sem commit.
+
+    Chamado pelas escritas do crud antes do commit, então rollup,
+    transações e a versão da família (cache de respostas) mudam na mesma
+    transação do banco. Os incrementos são feitos no SQL (total = total + :delta),
+    nunca lendo o total em Python: escritores concorrentes na mesma chave não
+    perdem deltas.
+    """
+    from sqlalchemy import delete, update
+
+    touch_families(db, {k[0] for k in deltas})
+    deltas = {k: v for k, v in deltas.items() if v[0] or v[1]}
+    if not deltas:
+        return
+
+    R = models.MonthlyRollup.__table__
+    colunas = ("user_id", "year_month", "type", "category", "currency")
+    for chave, (total, count) in deltas.items():
+        # IS NOT DISTINCT FROM: chaves com NULL (linhas antigas) também casam
+        filtro = [R.c[col].is_not_distinct_from(valor) for col, valor in zip(colunas, chave)]
+        atualizadas = db.execute(
+            update(R).where(*filtro).values(total=R.c.total + total, count=R.c.count + count)
+        ).rowcount
+        if not atualizadas:
+            # Chave nova; se outro escritor inseriu no meio tempo, o conflito vira incremento
+            database.upsert_increment(
+                db, R, [dict(zip(colunas, chave), total=total, count=count)], list(colunas), ["total", "count"]
+            )
+
+    db.execute(delete(R).where(
+        R.c.count <= 0,
+        R.c.user_id.in_({k[0] for k in deltas}),
+        R.c.year_month.in_({k[1] for k in deltas})
+    ))
+
+
+def rebuild_rollups(db: Session):
+    """Recalcula monthly_rollups a partir de todas as transações"""
+    from sqlalchemy import func
+
+    db.query(models.MonthlyRollup).delete(synchronize_session=False)
+    year_month = _year_month_expr(db)
+    rows = db.query(
+        models.Transaction.user_id,
+        year_month,
+        models.Transaction.type,
+        models.Transaction.category,
+        models.Transaction.currency,
+        func.coalesce(func.sum(models.Transaction.amount), 0),
+        func.count(models.Transaction.id)
+    ).filter(models.Transaction.date.isnot(None)).group_by(
+        models.Transaction.user_id, year_month, models.Transaction.type, models.Transaction.category,
+        models.Transaction.currency
+    ).all()
+    db.bulk_insert_mappings(models.MonthlyRollup, [
+        {"user_id": r[0], "year_month": r[1], "type": r[2], "category": r[3], "currency": r[4],
+         "total": r[5], "count": r[6]}
+        for r in rows
+    ])
+    db.commit()
+    return len(rows)
+
+
+def ensure_rollups(db: Session):
+    """Popula monthly_rollups na primeira subida após a migração (tabela vazia com transações)"""
+    if db.query(models.MonthlyRollup.id).first() is None and db.query(models.Transaction.id).first() is not None:
+        return rebuild_rollups(db)
+    return 0
+
+
+def _year_month_expr(db: Session):
+    """Expressão SQL "YYYY-MM" da data da transação conforme o banco"""
+    from sqlalchemy import func
+    if db.get_bind().dialect.name == "sqlite":
+        return func.strftime("%Y-%m", models.Transaction.date)
+    return func.to_char(models.Transaction.date, "YYYY-MM")
+
+
+def get_monthly_aggregates(db: Session, user_ids, data_inicio, data_fim, moeda: str = None,
+                           sem_cotacao: set = None):
+    """Linhas (year_month, type, category, total, quantidade) do intervalo.
+
+    Meses inteiros vêm de monthly_rollups; os meses parciais das pontas
+    (no máximo dois) são agregados direto das transações. Com moeda, os
+    rollups/pontas cobrem só essa moeda e as transações em outras moedas
+    entram convertidas pela cotação do dia (_foreign_totals; moedas sem
+    cotação entram sem conversão e são adicionadas a sem_cotacao).
+    """
+    import calendar
+    from datetime import date
+    from sqlalchemy import func
+
+    if data_inicio > data_fim:
+        return []
+
+    meses_inteiros = []
+    parciais = []
+    ano, mes = data_inicio.year, data_inicio.month
+    while (ano, mes) <= (data_fim.year, data_fim.month):
+        inicio_mes = date(ano, mes, 1)
+        fim_mes = date(ano, mes, calendar.monthrange(ano, mes)[1])
+        seg_inicio, seg_fim = max(data_inicio, inicio_mes), min(data_fim, fim_mes)
+        if seg_inicio == inicio_mes and seg_fim == fim_mes:
+            meses_inteiros.append(f"{ano}-{mes:02d}")
+        else:
+            parciais.append((f"{ano}-{mes:02d}", seg_inicio, seg_fim))
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+
+    resultado = []
+    if meses_inteiros:
+        filtros = [
+            models.MonthlyRollup.user_id.in_(user_ids),
+            models.MonthlyRollup.year_month >= meses_inteiros[0],
+            models.MonthlyRollup.year_month <= meses_inteiros[-1]
+        ]
+        if moeda:
+            filtros.append(_local_currency_filter(models.MonthlyRollup.currency, moeda))
+        resultado.extend(db.query(
+            models.MonthlyRollup.year_month,
+            models.MonthlyRollup.type,
+            models.MonthlyRollup.category,
+            func.sum(models.MonthlyRollup.total),
+            func.sum(models.MonthlyRollup.count)
+        ).filter(*filtros).group_by(
+            models.MonthlyRollup.year_month, models.MonthlyRollup.type, models.MonthlyRollup.category
+        ).all())
+
+    for year_month, seg_inicio, seg_fim in parciais:
+        filtros = [
+            models.Transaction.user_id.in_(user_ids),
+            models.Transaction.date >= seg_inicio,
+            models.Transaction.date <= seg_fim
+        ]
+        if moeda:
+            filtros.append(_local_currency_filter(models.Transaction.currency, moeda))
+        rows = db.query(
+            models.Transaction.type,
+            models.Transaction.category,
+            func.coalesce(func.sum(models.Transaction.amount), 0),
+            func.count(models.Transaction.id)
+        ).filter(*filtros).group_by(models.Transaction.type, models.Transaction.category).all()
+        resultado.extend((year_month,) + tuple(r) for r in rows)
+
+    if moeda:
+        estrangeiras = _foreign_totals(
+            db,
+            [_year_month_expr(db), models.Transaction.type, models.Transaction.category],
+            [
+                models.Transaction.user_id.in_(user_ids),
+                models.Transaction.date >= data_inicio,
+                models.Transaction.date <= data_fim
+            ],
+            moeda,
+            sem_cotacao
+        )
+        if estrangeiras:
+            return _merge_totals(resultado, estrangeiras)
+
+    return resultado
+
 
 # Transactions
 def get_transactions(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    # Verificar se usuario tem dependentes
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    
-    # Lista de IDs para buscar (o próprio usuario + dependentes)
-    user_ids = [user_id]
-    
-    if user and not user.parent_id:
-        # Se não é dependente (pode ser pai), buscar filhos
-        children = db.query(models.User).filter(models.User.parent_id == user_id).all()
-        for child in children:
-            user_ids.append(child.id)
-            
+    user_ids = get_family_user_ids(db, user_id)
     return db.query(models.Transaction).filter(models.Transaction.user_id.in_(user_ids)).offset(skip).limit(limit).all()
 
 def create_transaction(db: Session, transaction: schemas.TransactionCreate, user_id: int):
     db_transaction = models.Transaction(**transaction.dict(), user_id=user_id)
+    db_transaction.currency = fx.normalize_currency(db_transaction.currency) or get_user_currency(db, user_id)
+    db_transaction.next_due_date = template_next_due_date(db_transaction)
     db.add(db_transaction)
+    deltas = {}
+    _rollup_delta(deltas, db_transaction)
+    _apply_rollup_deltas(db, deltas)
     db.commit()
     db.refresh(db_transaction)
     return db_transaction
 
+def _insert_rows(db: Session, rows: list) -> list:
+    """INSERT em lote (executemany/RETURNING) de dicts de colunas + deltas dos rollups, sem commit.
+    Retorna os IDs na ordem das linhas."""
+    for row in rows:
+        # Mesmo conjunto de chaves em todas as linhas (executemany)
+        row.setdefault("next_due_date", template_next_due_date(SimpleNamespace(**row)))
+    stmt = insert(models.Transaction)
+    if db.get_bind().dialect.name == "sqlite":
+        # Em SQLite sort_by_parameter_order força um INSERT por linha; como os rowids
+        # novos são crescentes na ordem de inserção, ordenar os IDs devolve a ordem da entrada
+        ids = sorted(db.execute(stmt.returning(models.Transaction.id), rows).scalars())
+    else:
+        ids = list(db.execute(stmt.returning(models.Transaction.id, sort_by_parameter_order=True), rows).scalars())
+    deltas = {}
+    for row in rows:
+        _rollup_delta(deltas, SimpleNamespace(**row))
+    _apply_rollup_deltas(db, deltas)
+    return ids
+
+def create_transactions_batch(db: Session, transacoes: list, user_id: int, import_hashes: list = None) -> list:
+    """Insere um lote de transações com um único commit; retorna os IDs na mesma ordem.
+
+    INSERT em lote sem instanciar objetos ORM por linha.
+    """
+    rows = [dict(t.dict(), user_id=user_id) for t in transacoes]
+    moeda_padrao = get_user_currency(db, user_id)
+    for row in rows:
+        row["currency"] = fx.normalize_currency(row["currency"]) or moeda_padrao
+    if import_hashes:
+        for row, h in zip(rows, import_hashes):
+            row["import_hash"] = h
+    ids = _insert_rows(db, rows)
+    db.commit()
+    return ids
+
+def get_existing_import_hashes(db: Session, user_id: int, hashes: list) -> set:
+    """Subconjunto de hashes de importação que o usuário já tem"""
+    if not hashes:
+        return set()
+    rows = db.query(models.Transaction.import_hash).filter(
+        models.Transaction.user_id == user_id,
+        models.Transaction.import_hash.in_(hashes),
+    ).all()
+    return {r[0] for r in rows}
+
 def update_transaction(db: Session, transaction_id: int, transaction: schemas.TransactionUpdate, user_id: int):
     # Buscar transação primeiro sem filtro de user_id
     db_trans = db.query(models.Transaction).filter(models.Transaction.id == transaction_id).first()
@@ -41,18 +392,25 @@ def update_transaction(db: Session, transaction_id: int, transaction: schemas.Tr
                 return None # Sem permissão
 
     update_data = transaction.dict(exclude_unset=True)
-    # Convert date string to date object if present
-    if 'date' in update_data and update_data['date']:
+    # Data validada antes dos deltas de rollup (que dependem dela): null ou texto inválido -> ValueError
+    if 'date' in update_data:
         from datetime import datetime
-        if isinstance(update_data['date'], str):
-            try:
-                # Tentar vários formatos comuns se necessário, mas o padrão HTML é YYYY-MM-DD
-                update_data['date'] = datetime.strptime(update_data['date'], '%Y-%m-%d').date()
-            except ValueError:
-                pass 
-
+        try:
+            # Padrão HTML: YYYY-MM-DD
+            update_data['date'] = datetime.strptime(update_data['date'] or "", '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError(f"Fecha inválida: {update_data['date']!r}. Use el formato AAAA-MM-DD")
+    if 'currency' in update_data:
+        update_data['currency'] = fx.normalize_currency(update_data['currency']) or db_trans.currency
+
+    deltas = {}
+    _rollup_delta(deltas, db_trans, -1)
     for key, value in update_data.items():
         setattr(db_trans, key, value)
+    _rollup_delta(deltas, db_trans, +1)
+    _apply_rollup_deltas(db, deltas)
+    if update_data.keys() & {"is_recurring", "recurrence_day", "recurrence_active", "date"}:
+        db_trans.next_due_date = template_next_due_date(db_trans, _last_occurrence_date(db, db_trans.id))
     db.commit()
     db.refresh(db_trans)
     return db_trans
@@ -70,6 +428,9 @@ def delete_transaction(db: Session, transaction_id: int, user_id: int):
             if not (user and user.role == "subadmin" and owner and owner.parent_id == user.parent_id):
                 return None
 
+    deltas = {}
+    _rollup_delta(deltas, db_trans, -1)
+    _apply_rollup_deltas(db, deltas)
     db.delete(db_trans)
     db.commit()
     return db_trans
@@ -89,6 +450,7 @@ def create_budget(db: Session, budget: schemas.BudgetCreate, user_id: int):
     
     db_budget = models.Budget(**budget.dict(), user_id=user_id)
     db.add(db_budget)
+    touch_families(db, [user_id])
     db.commit()
     db.refresh(db_budget)
     return db_budget
@@ -99,6 +461,7 @@ def update_budget(db: Session, budget_id: int, budget: schemas.BudgetBase, user_
     if db_budget:
         db_budget.category = budget.category
         db_budget.limit_amount = budget.limit_amount
+        touch_families(db, [user_id])
         db.commit()
         db.refresh(db_budget)
     return db_budget
@@ -107,6 +470,7 @@ def delete_budget(db: Session, budget_id: int, user_id: int):
     val = db.query(models.Budget).filter(models.Budget.id == budget_id, models.Budget.user_id == user_id).first()
     if val:
         db.delete(val)
+        touch_families(db, [user_id])
         db.commit()
     return val
 
@@ -189,10 +553,18 @@ def create_user(db: Session, user: schemas.UserCreate, password_hash: str):
         currency=user.currency or "COP"
     )
     db.add(db_user)
+    if db_user.parent_id:
+        response_cache.bump(db, [response_cache.USERS_FAMILY])
     db.commit()
     db.refresh(db_user)
+    if db_user.parent_id:
+        invalidate_family_scope()
     return db_user
 
+# Campos do usuário que mudam escopo familiar, moeda ou permissões
+_USER_SCOPE_FIELDS = ("parent_id", "currency", "is_active", "role")
+
+
 def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate, password_hash: str = None):
     """Actualizar usuario"""
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -208,12 +580,18 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate, pass
         if password_hash:
             db_user.password_hash = password_hash
         
+        antes = {c: getattr(db_user, c) for c in _USER_SCOPE_FIELDS}
         for key, value in update_data.items():
             if key != 'password':
                 setattr(db_user, key, value)
+        # Moeda/família/permissões mudam as respostas e os escopos em cache
+        if any(getattr(db_user, c) != v for c, v in antes.items()):
+            response_cache.bump(db, [response_cache.USERS_FAMILY])
         
         db.commit()
         db.refresh(db_user)
+        if 'parent_id' in update_data or 'role' in update_data:
+            invalidate_family_scope()
     return db_user
 
 def toggle_user_status(db: Session, user_id: int):
@@ -221,6 +599,7 @@ def toggle_user_status(db: Session, user_id: int):
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
     if db_user:
         db_user.is_active = not db_user.is_active
+        response_cache.bump(db, [response_cache.USERS_FAMILY])
         db.commit()
         db.refresh(db_user)
     return db_user
@@ -230,7 +609,9 @@ def delete_user(db: Session, user_id: int):
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
     if db_user:
         db.delete(db_user)
+        response_cache.bump(db, [response_cache.USERS_FAMILY])
         db.commit()
+        invalidate_family_scope()
     return db_user
 
 def get_dependents(db: Session, user_id: int):
@@ -240,33 +621,12 @@ def get_dependents(db: Session, user_id: int):
 
 # ============ TRANSACTION SEARCH & FILTERS ============
 
-def get_transactions_filtered(db: Session, filtros: schemas.TransactionFilter, user_id: int):
-    """Buscar transações com filtros avançados"""
-    from sqlalchemy import or_, and_, desc, asc
-    
-    # Verificar se usuário tem dependentes
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    
-    # Lista de IDs para buscar (o próprio usuario + dependentes)
-    user_ids = [user_id]
-    
-    if user and (not user.parent_id or user.role == "subadmin"):
-        # Admin ou Subadmin (que pode ver tudo da família)
-        query_parent_id = user_id if not user.parent_id else user.parent_id
-        
-        # Adiciona o ID do "pai" da família (se não for o próprio)
-        if query_parent_id not in user_ids:
-            user_ids.append(query_parent_id)
-            
-        # Buscar todos os dependentes deste pai
-        children = db.query(models.User).filter(models.User.parent_id == query_parent_id).all()
-        for child in children:
-            if child.id not in user_ids:
-                user_ids.append(child.id)
-    
-    query = db.query(models.Transaction).filter(models.Transaction.user_id.in_(user_ids))
-    
-    # Aplicar filtros
+def _apply_transaction_filters(query, filtros: schemas.TransactionFilter, db: Session = None):
+    """Aplica os filtros de TransactionFilter (sem ordenação/paginação) a uma query.
+
+    Com db e índice full-text disponível, `busca` vira um join com
+    transactions_fts (prefixo por termo, sem acentos) em vez de ILIKE.
+    """
     if filtros.data_inicio:
         query = query.filter(models.Transaction.date >= filtros.data_inicio)
     
@@ -286,124 +646,303 @@ def get_transactions_filtered(db: Session, filtros: schemas.TransactionFilter, u
         query = query.filter(models.Transaction.amount <= filtros.valor_max)
     
     if filtros.busca:
-        # Busca textual na descrição (case-insensitive)
-        query = query.filter(models.Transaction.description.ilike(f"%{filtros.busca}%"))
-    
-    # Ordenação
-    order_column = models.Transaction.date  # padrão
-    if filtros.ordenar_por == "amount":
-        order_column = models.Transaction.amount
-    elif filtros.ordenar_por == "category":
-        order_column = models.Transaction.category
-    elif filtros.ordenar_por == "description":
-        order_column = models.Transaction.description
+        match = fts.build_match_query(filtros.busca)
+        if db is not None and match and fts.is_enabled(db):
+            # Busca full-text na descrição/categoria
+            query = query.join(fts.transactions_fts, fts.transactions_fts.c.rowid == models.Transaction.id).filter(
+                fts.transactions_fts.c[fts.FTS_TABLE].match(match)
+            )
+        else:
+            # Busca textual na descrição (case-insensitive)
+            query = query.filter(models.Transaction.description.ilike(f"%{filtros.busca}%"))
     
-    if filtros.ordem == "asc":
-        query = query.order_by(asc(order_column))
-    else:
-        query = query.order_by(desc(order_column))
+    return query
+
+
+def _uses_relevance(db: Session, filtros: schemas.TransactionFilter) -> bool:
+    """Ordenação por relevância (bm25) só vale com busca full-text ativa"""
+    return (filtros.ordenar_por == "relevance" and fts.build_match_query(filtros.busca) is not None
+            and fts.is_enabled(db))
+
+
+def _order_column(ordenar_por: str):
+    """Coluna de ordenação correspondente a TransactionFilter.ordenar_por"""
+    if ordenar_por == "amount":
+        return models.Transaction.amount
+    elif ordenar_por == "category":
+        return models.Transaction.category
+    elif ordenar_por == "description":
+        return models.Transaction.description
+    return models.Transaction.date  # padrão
+
+
+def encode_cursor(filtros: schemas.TransactionFilter, transacao: models.Transaction) -> str:
+    """Cursor opaco (base64 de JSON) com a chave de ordenação (valor, id) da última linha"""
+    import base64
+    import json
+
+    valor = getattr(transacao, _order_column(filtros.ordenar_por).key)
+    if hasattr(valor, "isoformat"):
+        valor = valor.isoformat()
+    elif isinstance(valor, Decimal):
+        valor = str(valor)
+    payload = {"o": filtros.ordenar_por, "d": filtros.ordem, "v": valor, "id": transacao.id}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(filtros: schemas.TransactionFilter, cursor: str):
+    """Decodifica o cursor em (valor, id). ValueError se inválido ou de outra ordenação"""
+    import base64
+    import json
+    from datetime import date
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        valor, last_id = payload["v"], int(payload["id"])
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+    if payload.get("o") != filtros.ordenar_por or payload.get("d") != filtros.ordem:
+        raise ValueError("El cursor no corresponde al orden solicitado")
+
+    if filtros.ordenar_por not in ("amount", "category", "description") and valor is not None:
+        valor = date.fromisoformat(valor)
+    return valor, last_id
+
+
+def _keyset_after(order_column, ordem: str, valor, last_id: int):
+    """Linhas depois da chave (valor, id) na ordem de get_transactions_filtered (NULL = menor valor).
+
+    Comparações com NULL nunca são verdadeiras, então valor None e linhas com
+    a coluna NULL entram com IS NULL / IS NOT NULL explícitos.
+    """
+    from sqlalchemy import and_, or_
+    T = models.Transaction
+    if ordem == "asc":
+        if valor is None:
+            return or_(order_column.isnot(None), and_(order_column.is_(None), T.id > last_id))
+        return or_(order_column > valor, and_(order_column == valor, T.id > last_id))
+    if valor is None:
+        return and_(order_column.is_(None), T.id < last_id)
+    return or_(order_column < valor, and_(order_column == valor, T.id < last_id), order_column.is_(None))
+
+
+def get_transactions_filtered(db: Session, filtros: schemas.TransactionFilter, user_id: int):
+    """Buscar transações com filtros avançados.
+
+    Paginação por offset (skip/limit) ou keyset: com filtros.cursor a página
+    começa logo após a chave (coluna de ordenação, id) do cursor, sem OFFSET.
+    Retorna (transacoes, proximo_cursor); total e estatísticas ficam em get_search_stats.
+    """
+    from sqlalchemy import desc, asc
     
-    # Paginação
-    total = query.count()
-    transacoes = query.offset(filtros.skip).limit(filtros.limit).all()
+    user_ids = get_family_user_ids(db, user_id)
     
-    return transacoes, total
-
-
-def get_transactions_stats(db: Session, transacoes: list = None, user_id: int = None):
-    """Calcular estatísticas agregadas de transações"""
-    if transacoes is None:
-        if user_id:
-            # Reutilizar lógica de IDs do get_transactions
-            user = db.query(models.User).filter(models.User.id == user_id).first()
-            user_ids = [user_id]
-            if user and not user.parent_id:
-                children = db.query(models.User).filter(models.User.parent_id == user_id).all()
-                for child in children:
-                    user_ids.append(child.id)
-            
-            transacoes = db.query(models.Transaction).filter(models.Transaction.user_id.in_(user_ids)).all()
-        else:
-            transacoes = db.query(models.Transaction).all()
+    query = db.query(models.Transaction).filter(models.Transaction.user_id.in_(user_ids))
+    query = _apply_transaction_filters(query, filtros, db)
+    relevancia = _uses_relevance(db, filtros)
     
-    if not transacoes:
-        return schemas.TransactionStats(
-            income=0,
-            expenses=0,
-            balance=0,
-            quantidade_transacoes=0,
-            quantidade_receitas=0,
-            quantidade_despesas=0,
-            media_receitas=0,
-            media_despesas=0,
-            por_categoria={}
-        )
+    # Ordenação (id desempata e torna a ordem estável entre páginas)
+    order_column = _order_column(filtros.ordenar_por)
+    direction = asc if filtros.ordem == "asc" else desc
+    if relevancia:
+        # rank do FTS5 (bm25): menor = mais relevante
+        query = query.order_by(fts.transactions_fts.c.rank, desc(models.Transaction.id))
+    else:
+        # NULL como menor valor nos dois bancos (Postgres o trata como maior por padrão)
+        nulls = "nulls_first" if filtros.ordem == "asc" else "nulls_last"
+        query = query.order_by(getattr(direction(order_column), nulls)(), direction(models.Transaction.id))
     
-    receitas = [t for t in transacoes if t.type == 'income']
-    despesas = [t for t in transacoes if t.type == 'expense']
+    # Paginação
+    if filtros.cursor and relevancia:
+        raise ValueError("La paginación por cursor no está disponible con orden por relevancia")
+    elif filtros.cursor:
+        valor, last_id = decode_cursor(filtros, filtros.cursor)
+        query = query.filter(_keyset_after(order_column, filtros.ordem, valor, last_id))
+    else:
+        query = query.offset(filtros.skip)
     
-    total_receitas = sum(t.amount for t in receitas)
-    total_despesas = sum(t.amount for t in despesas)
+    # Uma linha extra indica se existe próxima página
+    rows = query.limit(filtros.limit + 1).all()
+    transacoes = rows[:filtros.limit]
+    proximo_cursor = None
+    if filtros.limit > 0 and len(rows) > filtros.limit and not relevancia:
+        proximo_cursor = encode_cursor(filtros, transacoes[-1])
     
-    # Estatísticas por categoria
+    return transacoes, proximo_cursor
+
+
+# Agregados por (família, filtro) para contagem="cached"
+_search_stats_cache = TTLCache(
+    maxsize=int(os.getenv("SEARCH_STATS_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("SEARCH_STATS_CACHE_TTL", "60")),
+)
+
+
+def iter_transactions_export(db: Session, filtros: schemas.TransactionFilter, user_id: int, batch_size: int = 1000):
+    """Gera as transações filtradas da família (sem paginação) para exportação.
+
+    Seleciona colunas (não objetos ORM) com yield_per: as linhas chegam do
+    cursor em lotes de batch_size e nada fica acumulado no identity map.
+    """
+    from sqlalchemy import desc, asc
+
+    user_ids = get_family_user_ids(db, user_id)
+    T = models.Transaction
+    query = db.query(
+        T.id, T.date, T.description, T.category, T.type, T.amount, T.currency, T.user_id, models.User.username
+    ).join(models.User, models.User.id == T.user_id).filter(T.user_id.in_(user_ids))
+    query = _apply_transaction_filters(query, filtros, db)
+
+    direction = asc if filtros.ordem == "asc" else desc
+    if _uses_relevance(db, filtros):
+        query = query.order_by(fts.transactions_fts.c.rank, desc(T.id))
+    else:
+        query = query.order_by(direction(_order_column(filtros.ordenar_por)), direction(T.id))
+
+    yield from query.execution_options(yield_per=batch_size)
+
+
+def get_search_stats(db: Session, filtros: schemas.TransactionFilter, user_id: int):
+    """Estatísticas do filtro para a busca. Retorna (estatisticas, exato).
+
+    O total da busca é estatisticas.quantidade_transacoes, então não há um
+    COUNT separado. Com contagem="cached" o agregado pode vir de um cache por
+    (família, filtro) com TTL curto; nesse caso exato=False.
+    """
+    user_ids = get_family_user_ids(db, user_id)
+    chave = (user_ids, filtros.data_inicio, filtros.data_fim, filtros.tipo, filtros.categoria,
+             filtros.valor_min, filtros.valor_max, filtros.busca)
+
+    if filtros.contagem == "cached":
+        estatisticas = _search_stats_cache.get(chave)
+        if estatisticas is not None:
+            return estatisticas, False
+
+    estatisticas = get_transactions_stats(db, user_id=user_id, filtros=filtros)
+    _search_stats_cache.set(chave, estatisticas)
+    return estatisticas, True
+
+
+def get_transactions_stats(db: Session, user_id: int = None, filtros: schemas.TransactionFilter = None):
+    """Calcular estatísticas agregadas de transações direto no banco.
+
+    Um único SUM/COUNT ... GROUP BY type, category; nenhuma transação é
+    carregada como objeto ORM.
+    """
+    from sqlalchemy import func
+
+    query = db.query(
+        models.Transaction.type,
+        models.Transaction.category,
+        func.coalesce(func.sum(models.Transaction.amount), 0).label("total"),
+        func.count(models.Transaction.id).label("quantidade")
+    )
+    if user_id:
+        query = query.filter(models.Transaction.user_id.in_(get_family_user_ids(db, user_id)))
+    if filtros:
+        query = _apply_transaction_filters(query, filtros, db)
+    rows = query.group_by(models.Transaction.type, models.Transaction.category).all()
+
+    return _build_transaction_stats(rows)
+
+
+def _build_transaction_stats(rows) -> schemas.TransactionStats:
+    """Monta TransactionStats a partir de linhas (type, category, total, quantidade)"""
+    total_receitas = total_despesas = 0
+    qtd_receitas = qtd_despesas = qtd_total = 0
     por_categoria = {}
-    for t in transacoes:
-        if t.category not in por_categoria:
-            por_categoria[t.category] = {'total': 0, 'quantidade': 0}
-        por_categoria[t.category]['total'] += t.amount
-        por_categoria[t.category]['quantidade'] += 1
-    
+
+    for tipo, categoria, total, quantidade in rows:
+        qtd_total += quantidade
+        if tipo == 'income':
+            total_receitas += total
+            qtd_receitas += quantidade
+        elif tipo == 'expense':
+            total_despesas += total
+            qtd_despesas += quantidade
+
+        if categoria not in por_categoria:
+            por_categoria[categoria] = {'total': 0, 'quantidade': 0}
+        por_categoria[categoria]['total'] += total
+        por_categoria[categoria]['quantidade'] += quantidade
+
+    # dict livre no schema: Decimal viraria string no JSON
+    for dados in por_categoria.values():
+        dados['total'] = float(dados['total'])
+
     return schemas.TransactionStats(
         income=total_receitas,
         expenses=total_despesas,
         balance=total_receitas - total_despesas,
-        quantidade_transacoes=len(transacoes),
-        quantidade_receitas=len(receitas),
-        quantidade_despesas=len(despesas),
-        media_receitas=total_receitas / len(receitas) if receitas else 0,
-        media_despesas=total_despesas / len(despesas) if despesas else 0,
+        quantidade_transacoes=qtd_total,
+        quantidade_receitas=qtd_receitas,
+        quantidade_despesas=qtd_despesas,
+        media_receitas=total_receitas / qtd_receitas if qtd_receitas else 0,
+        media_despesas=total_despesas / qtd_despesas if qtd_despesas else 0,
         por_categoria=por_categoria
     )
 
 
-def get_transactions_by_period(db: Session, data_inicio, data_fim, user_id: int, agrupar_por: str = "month"):
-    """Obter transações agrupadas por período"""
-    from datetime import datetime
+def get_daily_aggregates(db: Session, user_ids, data_inicio, data_fim, moeda: str = None,
+                         sem_cotacao: set = None):
+    """Linhas (date, type, total, quantidade) por dia do intervalo, agregadas no banco.
+
+    Uma linha por (dia, tipo, moeda) com movimento, independente do número de
+    transações; semanas são montadas sobre elas em _evolucao_diaria. Como o dia
+    já está na chave, a conversão para moeda sai da mesma consulta.
+    """
+    from sqlalchemy import func
+
+    T = models.Transaction
+    rows = db.query(
+        T.date, T.type, T.currency, func.coalesce(func.sum(T.amount), 0), func.count(T.id)
+    ).filter(
+        T.user_id.in_(user_ids), T.date >= data_inicio, T.date <= data_fim
+    ).group_by(T.date, T.type, T.currency).all()
+
+    totais = [r[3] for r in rows]
+    if moeda:
+        totais = fx.convert_totals(db, [(r[2] or moeda, r[0], r[3]) for r in rows], moeda, sem_cotacao)
+    return _merge_totals([(r[0], r[1], total, r[4]) for r, total in zip(rows, totais)])
+
+
+def _evolucao_diaria(linhas, agrupar_por: str):
+    """PeriodoStats por dia/semana a partir de linhas (date, type, total, quantidade)"""
     from collections import defaultdict
-    
-    # Verificar pai/filhos
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    user_ids = [user_id]
-    if user and not user.parent_id:
-        children = db.query(models.User).filter(models.User.parent_id == user_id).all()
-        for child in children:
-            user_ids.append(child.id)
-    
-    transacoes = db.query(models.Transaction).filter(
-        models.Transaction.user_id.in_(user_ids),
-        models.Transaction.date >= data_inicio,
-        models.Transaction.date <= data_fim
-    ).all()
-    
-    # Agrupar por período
+
+    formato = "%Y-W%W" if agrupar_por == "week" else "%Y-%m-%d"
     periodos = defaultdict(lambda: {'receitas': 0, 'despesas': 0, 'quantidade': 0})
+    for dia, tipo, total, quantidade in linhas:
+        periodo_key = dia.strftime(formato)
+        if tipo == 'income':
+            periodos[periodo_key]['receitas'] += total
+        else:
+            periodos[periodo_key]['despesas'] += total
+        periodos[periodo_key]['quantidade'] += quantidade
     
-    for t in transacoes:
-        # Determinar chave do período
-        if agrupar_por == "day":
-            periodo_key = t.date.strftime("%Y-%m-%d")
-        elif agrupar_por == "week":
-            periodo_key = t.date.strftime("%Y-W%W")
-        else:  # month
-            periodo_key = t.date.strftime("%Y-%m")
-        
-        if t.type == 'income':
-            periodos[periodo_key]['receitas'] += t.amount
+    return _periodos_to_stats(periodos)
+
+
+def _evolucao_mensal(linhas):
+    """PeriodoStats mensais a partir de linhas (year_month, type, category, total, quantidade)"""
+    from collections import defaultdict
+
+    periodos = defaultdict(lambda: {'receitas': 0, 'despesas': 0, 'quantidade': 0})
+    for year_month, tipo, _categoria, total, quantidade in linhas:
+        if tipo == 'income':
+            periodos[year_month]['receitas'] += total
         else:
-            periodos[periodo_key]['despesas'] += t.amount
-        periodos[periodo_key]['quantidade'] += 1
+            periodos[year_month]['despesas'] += total
+        periodos[year_month]['quantidade'] += quantidade
     
-    # Converter para lista de PeriodoStats
+    return _periodos_to_stats(periodos)
+
+
+def _periodos_to_stats(periodos):
+    """Converter {periodo: dados} para lista ordenada de PeriodoStats"""
     evolucao = []
     for periodo, dados in sorted(periodos.items()):
         evolucao.append(schemas.PeriodoStats(
@@ -413,8 +952,149 @@ def get_transactions_by_period(db: Session, data_inicio, data_fim, user_id: int,
             saldo=dados['receitas'] - dados['despesas'],
             quantidade=dados['quantidade']
         ))
+    return evolucao
+
+
+def _top_categorias(linhas, tipo: str, limite: int = 5):
+    """Top categorias de um tipo a partir de linhas (year_month, type, category, total, quantidade)"""
+    categorias = {}
+    for _year_month, t_tipo, categoria, total, quantidade in linhas:
+        if t_tipo != tipo:
+            continue
+        if categoria not in categorias:
+            categorias[categoria] = {'categoria': categoria, 'total': 0, 'quantidade': 0}
+        categorias[categoria]['total'] += total
+        categorias[categoria]['quantidade'] += quantidade
     
-    return transacoes, evolucao
+    top = sorted(categorias.values(), key=lambda x: x['total'], reverse=True)[:limite]
+    for c in top:
+        c['total'] = float(c['total'])
+    return top
+
+
+def get_transactions_report(db: Session, data_inicio, data_fim, user_id: int, agrupar_por: str = "month",
+                            moeda: str = None, incluir_transacoes: bool = True, limit: int = None,
+                            cursor: str = None):
+    """Relatório do período. Estatísticas, evolução mensal e top categorias
+    saem dos rollups mensais (mais as pontas parciais do intervalo) e a
+    evolução diária/semanal de um agregado por dia; nenhum total percorre
+    as transações carregadas. Totais em moeda (padrão: moeda do usuário).
+
+    Linhas: incluir_transacoes=False devolve só os agregados; com limit, uma
+    página (data desc, keyset por cursor como na busca); sem limit, todas.
+    """
+    user_ids = get_family_user_ids(db, user_id)
+    moeda = fx.normalize_currency(moeda) or get_user_currency(db, user_id)
+    sem_cotacao = set()
+    mensal = get_monthly_aggregates(db, user_ids, data_inicio, data_fim, moeda, sem_cotacao)
+
+    transacoes, proximo_cursor = [], None
+    if incluir_transacoes and limit is not None:
+        filtros = schemas.TransactionFilter(data_inicio=data_inicio, data_fim=data_fim, limit=limit, cursor=cursor)
+        transacoes, proximo_cursor = get_transactions_filtered(db, filtros, user_id)
+    elif incluir_transacoes:
+        transacoes = db.query(models.Transaction).filter(
+            models.Transaction.user_id.in_(user_ids),
+            models.Transaction.date >= data_inicio,
+            models.Transaction.date <= data_fim
+        ).all()
+
+    if agrupar_por in ("day", "week"):
+        evolucao = _evolucao_diaria(
+            get_daily_aggregates(db, user_ids, data_inicio, data_fim, moeda, sem_cotacao), agrupar_por
+        )
+    else:
+        evolucao = _evolucao_mensal(mensal)
+
+    return schemas.TransactionReport(
+        data_inicio=data_inicio,
+        data_fim=data_fim,
+        transacoes=transacoes,
+        estatisticas=_build_transaction_stats([linha[1:] for linha in mensal]),
+        evolucao_temporal=evolucao,
+        top_categorias_despesas=_top_categorias(mensal, 'expense'),
+        top_categorias_receitas=_top_categorias(mensal, 'income'),
+        currency=moeda,
+        moedas_sem_cotacao=sorted(sem_cotacao),
+        proximo_cursor=proximo_cursor
+    )
+
+
+# ============ SUMMARY ============
+
+def get_summary(db: Session, user_id: int, moeda: str = None):
+    """Resumo do dashboard: saldo, receitas por categoria e orçamentos.
+
+    Número fixo de consultas independente do histórico: um agregado
+    GROUP BY type, category sobre toda a família e a lista de orçamentos.
+    A chave case-insensitive dos orçamentos é montada sobre as linhas já
+    agrupadas (poucas dezenas), preservando a semântica de str.lower().
+    Totais em moeda (padrão: moeda do usuário); transações em outras
+    moedas entram convertidas por _foreign_totals (sem cotação: sem conversão,
+    listadas em moedas_sem_cotacao).
+    """
+    from sqlalchemy import func
+
+    user_ids = get_family_user_ids(db, user_id)
+    moeda = fx.normalize_currency(moeda) or get_user_currency(db, user_id)
+    T = models.Transaction
+    rows = db.query(
+        T.type,
+        T.category,
+        func.coalesce(func.sum(T.amount), 0),
+        func.count(T.id)
+    ).filter(
+        T.user_id.in_(user_ids), _local_currency_filter(T.currency, moeda)
+    ).group_by(T.type, T.category).all()
+    sem_cotacao = set()
+    estrangeiras = _foreign_totals(db, [T.type, T.category], [T.user_id.in_(user_ids)], moeda, sem_cotacao)
+    if estrangeiras:
+        rows = _merge_totals(rows, estrangeiras)
+
+    total_income = 0
+    total_expenses = 0
+    income_breakdown = {}
+    por_categoria = {}  # categoria.lower() -> {'income': x, 'expense': y}
+
+    for tipo, categoria, total, _quantidade in rows:
+        if tipo == 'income':
+            total_income += total
+            income_breakdown[categoria] = income_breakdown.get(categoria, 0) + total
+        elif tipo == 'expense':
+            total_expenses += total
+        if categoria is not None and tipo in ('income', 'expense'):
+            chave = por_categoria.setdefault(categoria.lower(), {'income': 0, 'expense': 0})
+            chave[tipo] += total
+
+    budget_status = []
+    for budget in get_budgets(db, user_id):
+        cat = por_categoria.get(budget.category.lower(), {'income': 0, 'expense': 0})
+        cat_income = cat['income']
+        cat_expense = cat['expense']
+        effective_limit = budget.limit_amount + cat_income
+        percentage = (cat_expense / effective_limit) * 100 if effective_limit > 0 else 0
+
+        budget_status.append({
+            "id": budget.id,
+            "category": budget.category,
+            "limit": effective_limit,
+            "original_limit": budget.limit_amount,
+            "income_boost": cat_income,
+            "spent": cat_expense,
+            "percentage": percentage,
+            "alert": percentage >= 70,
+            "critical": percentage >= 90
+        })
+
+    return {
+        "balance": total_income - total_expenses,
+        "income": total_income,
+        "expenses": total_expenses,
+        "income_breakdown": income_breakdown,
+        "budgets": budget_status,
+        "currency": moeda,
+        "moedas_sem_cotacao": sorted(sem_cotacao)
+    }
 
 
 # ============ FEATURE #17 — TRANSAÇÕES RECORRENTES ============
@@ -426,82 +1106,214 @@ def get_recurring_transactions(db: Session, user_id: int):
         models.Transaction.is_recurring == True
     ).all()
 
-def apply_recurring_transactions(db: Session, user_id: int):
-    """Aplica transações recorrentes no mês atual (idempotente)"""
+def deactivate_recurring(db: Session, transaction_id: int, user_id: int):
+    """Desativa uma transação recorrente do usuário. Retorna False se não existir"""
+    t = db.query(models.Transaction).filter(
+        models.Transaction.id == transaction_id,
+        models.Transaction.user_id == user_id,
+        models.Transaction.is_recurring == True
+    ).first()
+    if not t:
+        return False
+    t.recurrence_active = False
+    t.next_due_date = None
+    touch_families(db, [user_id])
+    db.commit()
+    return True
+
+# Meses retroativos gerados no máximo por template (catch-up após downtime)
+RECURRING_MAX_CATCHUP_MONTHS = int(os.getenv("RECURRING_MAX_CATCHUP_MONTHS", "12"))
+
+
+def _add_months(inicio_mes, n: int):
+    """Primeiro dia do mês n meses depois de inicio_mes (n pode ser negativo)"""
     from datetime import date
-    today = date.today()
-    current_month = today.month
-    current_year = today.year
+    total = inicio_mes.year * 12 + inicio_mes.month - 1 + n
+    return date(total // 12, total % 12 + 1, 1)
 
-    recorrentes = get_recurring_transactions(db, user_id)
-    criadas = []
 
-    for r in recorrentes:
-        if not r.recurrence_active or not r.recurrence_day:
-            continue
+def recurrence_due_date(inicio_mes, recurrence_day: int):
+    """Data da ocorrência no mês: recurrence_day limitado ao último dia do mês (31 -> 28/29/30)"""
+    import calendar
+    ultimo_dia = calendar.monthrange(inicio_mes.year, inicio_mes.month)[1]
+    return inicio_mes.replace(day=min(max(recurrence_day, 1), ultimo_dia))
 
-        # Verificar se já foi aplicada este mês (evitar duplicidade no mesmo mês/ano)
-        existing = db.query(models.Transaction).filter(
-            models.Transaction.user_id == user_id,
-            models.Transaction.description == r.description,
-            models.Transaction.amount == r.amount,
-            models.Transaction.category == r.category,
-            models.Transaction.is_recurring == False,
-            models.Transaction.date >= date(current_year, current_month, 1),
-            models.Transaction.date <= date(current_year, current_month, 28 if current_month == 2 else 30) # Aproximação segura
-        ).first()
-
-        if existing:
-            continue
 
-        import calendar
-        ultimo_dia = calendar.monthrange(current_year, current_month)[1]
-        dia = min(r.recurrence_day, ultimo_dia)
-        target_date = date(current_year, current_month, dia)
-
-        nova = models.Transaction(
-            description=r.description,
-            amount=r.amount,
-            type=r.type,
-            category=r.category,
-            date=target_date,
-            user_id=user_id,
-            is_recurring=False,
-            recurrence_day=None,
-            recurrence_active=True
-        )
-        db.add(nova)
-        criadas.append(nova)
+def template_next_due_date(template, ultima_ocorrencia=None, hoje=None):
+    """Próximo vencimento de um template. None se não for um template recorrente ativo.
 
-    if criadas:
+    - Com ocorrências geradas: mês seguinte ao da última (o agendador faz o
+      catch-up a partir dele, limitado a RECURRING_MAX_CATCHUP_MONTHS)
+    - Sem ocorrências: mês seguinte ao do template, mas nunca antes do mês
+      atual (um template de janeiro cadastrado em outubro começa em outubro,
+      sem gerar fevereiro a setembro)
+    """
+    from datetime import date
+    if not (template.is_recurring and template.recurrence_day
+            and template.recurrence_active is not False and template.date):
+        return None
+    base = max(filter(None, (template.date, ultima_ocorrencia)))
+    mes = _add_months(date(base.year, base.month, 1), 1)
+    if ultima_ocorrencia is None:
+        hoje = hoje or date.today()
+        mes = max(mes, date(hoje.year, hoje.month, 1))
+    return recurrence_due_date(mes, template.recurrence_day)
+
+
+def _last_occurrence_date(db: Session, template_id: int):
+    from sqlalchemy import func
+    return db.query(func.max(models.Transaction.date)).filter(
+        models.Transaction.recurring_template_id == template_id
+    ).scalar()
+
+
+def apply_due_recurring(db: Session, ate, user_id: int = None, batch_size: int = 500) -> list:
+    """Gera as ocorrências de templates recorrentes com next_due_date até `ate`.
+
+    Consulta por intervalo no índice de next_due_date, em lotes de templates
+    (keyset por id). Cada template gera os meses de next_due_date até `ate`
+    (catch-up limitado a RECURRING_MAX_CATCHUP_MONTHS; templates nunca
+    aplicados já começam no mês atual, ver template_next_due_date) e tem next_due_date
+    avançado para o primeiro vencimento depois de `ate`, tudo em um INSERT em
+    lote + commit por lote. Idempotente; com user_id limita aos templates do
+    usuário. Retorna os IDs criados.
+    """
+    from datetime import date
+    from sqlalchemy import bindparam, update
+
+    T = models.Transaction
+    query = db.query(T).filter(T.next_due_date <= ate, T.recurrence_active == True)
+    if user_id is not None:
+        query = query.filter(T.user_id == user_id)
+    if db.get_bind().dialect.name != "sqlite":
+        # Workers concorrentes pulam templates já em processamento
+        query = query.with_for_update(skip_locked=True)
+
+    primeiro_mes = _add_months(date(ate.year, ate.month, 1), -(RECURRING_MAX_CATCHUP_MONTHS - 1))
+    avancar = update(T.__table__).where(T.__table__.c.id == bindparam("tid")).values(
+        next_due_date=bindparam("proximo")
+    )
+    criadas = []
+    ultimo_id = 0
+    while True:
+        templates = query.filter(T.id > ultimo_id).order_by(T.id).limit(batch_size).all()
+        if not templates:
+            break
+        ultimo_id = templates[-1].id
+
+        rows = []
+        proximos = []
+        for tpl in templates:
+            vencimento = tpl.next_due_date
+            mes = max(date(vencimento.year, vencimento.month, 1), primeiro_mes)
+            while True:
+                vencimento = recurrence_due_date(mes, tpl.recurrence_day)
+                if vencimento > ate:
+                    break
+                rows.append(dict(
+                    description=tpl.description,
+                    amount=tpl.amount,
+                    type=tpl.type,
+                    category=tpl.category,
+                    currency=tpl.currency,
+                    date=vencimento,
+                    user_id=tpl.user_id,
+                    is_recurring=False,
+                    recurrence_day=None,
+                    recurrence_active=True,
+                    recurring_template_id=tpl.id,
+                ))
+                mes = _add_months(mes, 1)
+            proximos.append({"tid": tpl.id, "proximo": vencimento})
+
+        if rows:
+            criadas.extend(_insert_rows(db, rows))
+        db.execute(avancar, proximos)
         db.commit()
-        for t in criadas:
-            db.refresh(t)
 
     return criadas
 
 
+def get_upcoming_recurring(db: Session, user_id: int, inicio, fim) -> list:
+    """Pagamentos recorrentes da família com vencimento entre inicio e fim.
+
+    Junta templates com next_due_date no intervalo (ainda não lançados) e
+    ocorrências já geradas com data no intervalo (lançadas antecipadamente
+    por apply-recurring). Ambas são consultas por intervalo indexadas.
+    """
+    T = models.Transaction
+    user_ids = get_family_user_ids(db, user_id)
+    pendentes = db.query(T).filter(
+        T.next_due_date >= inicio, T.next_due_date <= fim,
+        T.recurrence_active == True, T.user_id.in_(user_ids),
+    ).all()
+    lancadas = db.query(T).filter(
+        T.user_id.in_(user_ids), T.date >= inicio, T.date <= fim,
+        T.recurring_template_id.isnot(None),
+    ).all()
+
+    itens = [
+        {"template_id": t.id, "description": t.description, "amount": t.amount, "type": t.type,
+         "category": t.category, "due_date": t.next_due_date, "user_id": t.user_id, "lancada": False}
+        for t in pendentes
+    ] + [
+        {"template_id": t.recurring_template_id, "description": t.description, "amount": t.amount,
+         "type": t.type, "category": t.category, "due_date": t.date, "user_id": t.user_id,
+         "lancada": True, "transaction_id": t.id}
+        for t in lancadas
+    ]
+    itens.sort(key=lambda i: (i["due_date"], i["description"] or ""))
+    return itens
+
+
+def apply_recurring_transactions(db: Session, user_id: int):
+    """Aplica as transações recorrentes do usuário até o fim do mês atual (idempotente).
+    Retorna os IDs criados"""
+    from datetime import date
+    import calendar
+    today = date.today()
+    fim_mes = today.replace(day=calendar.monthrange(today.year, today.month)[1])
+    return apply_due_recurring(db, fim_mes, user_id=user_id)
+
+
 # ============ FEATURE #6 — STATUS DE ORÇAMENTO ============
 
 def get_budget_status(db: Session, user_id: int):
     """Retorna status de todos os orçamentos com % do gasto atual no mês"""
     from datetime import date
+    from sqlalchemy import func
     today = date.today()
     inicio_mes = date(today.year, today.month, 1)
 
     budgets = get_budgets(db, user_id)
+    if not budgets:
+        return []
+
+    # Um único agregado do mês para todas as categorias com orçamento (na moeda do usuário)
+    moeda = get_user_currency(db, user_id)
+    T = models.Transaction
+    filtros = [
+        T.user_id == user_id,
+        T.category.in_({b.category for b in budgets}),
+        T.type == "expense",
+        T.date >= inicio_mes,
+        T.date <= today
+    ]
+    rows = db.query(
+        T.category,
+        func.coalesce(func.sum(T.amount), 0),
+        func.count(T.id)
+    ).filter(*filtros, _local_currency_filter(T.currency, moeda)).group_by(T.category).all()
+    sem_cotacao = set()
+    estrangeiras = _foreign_totals(db, [T.category], filtros, moeda, sem_cotacao)
+    if estrangeiras:
+        rows = _merge_totals(rows, estrangeiras)
+    gastos = {categoria: total for categoria, total, _quantidade in rows}
+
     status_list = []
 
     for budget in budgets:
-        spent_rows = db.query(models.Transaction).filter(
-            models.Transaction.user_id == user_id,
-            models.Transaction.category == budget.category,
-            models.Transaction.type == "expense",
-            models.Transaction.date >= inicio_mes,
-            models.Transaction.date <= today
-        ).all()
-
-        total_spent = sum(t.amount for t in spent_rows)
+        total_spent = gastos.get(budget.category, 0)
         percentage = (total_spent / budget.limit_amount * 100) if budget.limit_amount > 0 else 0
 
         status_list.append(schemas.BudgetStatus(
@@ -510,7 +1322,8 @@ def get_budget_status(db: Session, user_id: int):
             spent=round(total_spent, 2),
             percentage=round(percentage, 1),
             alert=percentage >= 80,
-            exceeded=percentage >= 100
+            exceeded=percentage >= 100,
+            moedas_sem_cotacao=sorted(sem_cotacao)
         ))
 
     return status_list
@@ -518,8 +1331,8 @@ def get_budget_status(db: Session, user_id: int):
 
 # ============ FEATURE #3 — ANALYTICS POR CATEGORIA ============
 
-def get_category_analytics(db: Session, user_id: int, period: str = None):
-    """Retorna analytics de gastos e receitas agrupados por categoria"""
+def get_category_analytics(db: Session, user_id: int, period: str = None, moeda: str = None):
+    """Retorna analytics de gastos e receitas agrupados por categoria (totais em moeda, padrão: do usuário)"""
     from datetime import date
     import calendar
 
@@ -538,37 +1351,28 @@ def get_category_analytics(db: Session, user_id: int, period: str = None):
     fim = date(year, month, ultimo_dia)
     period_str = f"{year}-{month:02d}"
 
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    user_ids = [user_id]
-    if user and not user.parent_id:
-        children = db.query(models.User).filter(models.User.parent_id == user_id).all()
-        for c in children:
-            user_ids.append(c.id)
-
-    transacoes = db.query(models.Transaction).filter(
-        models.Transaction.user_id.in_(user_ids),
-        models.Transaction.date >= inicio,
-        models.Transaction.date <= fim
-    ).all()
+    user_ids = get_family_user_ids(db, user_id)
+
+    # Mês inteiro: lido de monthly_rollups (poucas linhas, independente do histórico)
+    moeda = fx.normalize_currency(moeda) or get_user_currency(db, user_id)
+    sem_cotacao = set()
+    linhas = get_monthly_aggregates(db, user_ids, inicio, fim, moeda, sem_cotacao)
 
     despesas = {}
     receitas = {}
-    total_despesas = 0.0
-    total_receitas = 0.0
-
-    for t in transacoes:
-        if t.type == "expense":
-            total_despesas += t.amount
-            if t.category not in despesas:
-                despesas[t.category] = {"total": 0.0, "count": 0}
-            despesas[t.category]["total"] += t.amount
-            despesas[t.category]["count"] += 1
+    total_despesas = 0
+    total_receitas = 0
+
+    for _year_month, tipo, categoria, total, quantidade in linhas:
+        destino = despesas if tipo == "expense" else receitas
+        if tipo == "expense":
+            total_despesas += total
         else:
-            total_receitas += t.amount
-            if t.category not in receitas:
-                receitas[t.category] = {"total": 0.0, "count": 0}
-            receitas[t.category]["total"] += t.amount
-            receitas[t.category]["count"] += 1
+            total_receitas += total
+        if categoria not in destino:
+            destino[categoria] = {"total": 0, "count": 0}
+        destino[categoria]["total"] += total
+        destino[categoria]["count"] += quantidade
 
     def build_list(data, total):
         result = []
@@ -586,5 +1390,7 @@ def get_category_analytics(db: Session, user_id: int, period: str = None):
         expenses_by_category=build_list(despesas, total_despesas),
         income_by_category=build_list(receitas, total_receitas),
         total_expenses=round(total_despesas, 2),
-        total_income=round(total_receitas, 2)
+        total_income=round(total_receitas, 2),
+        currency=moeda,
+        moedas_sem_cotacao=sorted(sem_cotacao)
     )
@@ -0,0 +1,145 @@
+"""
+Versões assíncronas das funções do crud, para as rotas async.
+
+As consultas continuam definidas uma única vez em crud.py: cada função
+roda a versão síncrona dentro de AsyncSession.run_sync, que executa o
+código ORM sobre o driver assíncrono sem bloquear o event loop. Objetos
+ORM são convertidos para schemas ainda dentro do run_sync, para que
+relacionamentos lazy (ex.: Transaction.user) não sejam carregados fora dele.
+"""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import crud, models, schemas, response_cache
+
+
+def _to_schema(schema, obj):
+    return schema.model_validate(obj) if obj is not None else None
+
+
+def _to_schemas(schema, objs):
+    return [schema.model_validate(o) for o in objs]
+
+
+async def _cached(db: AsyncSession, endpoint: str, user_id: int, params, compute):
+    """Resposta analítica via response_cache (invalidada pelas escritas da família).
+    compute recebe a sessão síncrona e roda em run_sync; o backend fica fora dele.
+    Raiz e versões vêm dos caches já validados na autenticação (sem consulta no acerto)."""
+    familia = await db.run_sync(crud.get_family_root, user_id)
+    return await response_cache.cached(db, endpoint, familia, user_id, params, compute)
+
+
+# ============ USERS ============
+
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.get(models.User, user_id)
+
+async def get_user_by_username(db: AsyncSession, username: str):
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    return result.scalars().first()
+
+async def get_dependents(db: AsyncSession, user_id: int):
+    result = await db.execute(select(models.User).where(models.User.parent_id == user_id))
+    return result.scalars().all()
+
+async def get_family_user_ids(db: AsyncSession, user_id: int) -> frozenset:
+    return await db.run_sync(crud.get_family_user_ids, user_id)
+
+
+# ============ TRANSACTIONS ============
+
+async def get_transactions(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100):
+    return await db.run_sync(
+        lambda s: _to_schemas(schemas.Transaction, crud.get_transactions(s, user_id, skip, limit))
+    )
+
+async def get_transactions_filtered(db: AsyncSession, filtros: schemas.TransactionFilter, user_id: int):
+    def _run(s):
+        transacoes, proximo_cursor = crud.get_transactions_filtered(s, filtros, user_id)
+        return _to_schemas(schemas.Transaction, transacoes), proximo_cursor
+    return await db.run_sync(_run)
+
+async def get_search_stats(db: AsyncSession, filtros: schemas.TransactionFilter, user_id: int):
+    return await db.run_sync(crud.get_search_stats, filtros, user_id)
+
+async def get_transactions_report(db: AsyncSession, data_inicio, data_fim, user_id: int, agrupar_por: str = "month",
+                                  moeda: str = None, incluir_transacoes: bool = True, limit: int = None,
+                                  cursor: str = None):
+    args = (data_inicio, data_fim, user_id, agrupar_por, moeda, incluir_transacoes, limit, cursor)
+    if incluir_transacoes and limit is None:
+        # Todas as linhas do período: grande demais para o cache
+        return await db.run_sync(crud.get_transactions_report, *args)
+    return await _cached(db, "report", user_id, args, lambda s: crud.get_transactions_report(s, *args))
+
+async def create_transaction(db: AsyncSession, transaction: schemas.TransactionCreate, user_id: int):
+    return await db.run_sync(
+        lambda s: _to_schema(schemas.Transaction, crud.create_transaction(s, transaction, user_id))
+    )
+
+async def create_transactions_batch(db: AsyncSession, transacoes: list, user_id: int):
+    return await db.run_sync(crud.create_transactions_batch, transacoes, user_id)
+
+async def update_transaction(db: AsyncSession, transaction_id: int, transaction: schemas.TransactionUpdate, user_id: int):
+    return await db.run_sync(
+        lambda s: _to_schema(schemas.Transaction, crud.update_transaction(s, transaction_id, transaction, user_id))
+    )
+
+async def delete_transaction(db: AsyncSession, transaction_id: int, user_id: int):
+    return await db.run_sync(lambda s: crud.delete_transaction(s, transaction_id, user_id) is not None)
+
+
+# ============ RECORRENTES ============
+
+async def get_recurring_transactions(db: AsyncSession, user_id: int):
+    return await db.run_sync(
+        lambda s: _to_schemas(schemas.Transaction, crud.get_recurring_transactions(s, user_id))
+    )
+
+async def apply_recurring_transactions(db: AsyncSession, user_id: int):
+    """Retorna os ids das transações criadas"""
+    return await db.run_sync(crud.apply_recurring_transactions, user_id)
+
+async def get_upcoming_recurring(db: AsyncSession, user_id: int, inicio, fim):
+    return await db.run_sync(crud.get_upcoming_recurring, user_id, inicio, fim)
+
+async def deactivate_recurring(db: AsyncSession, transaction_id: int, user_id: int):
+    return await db.run_sync(crud.deactivate_recurring, transaction_id, user_id)
+
+
+# ============ BUDGETS ============
+
+async def get_budgets(db: AsyncSession, user_id: int):
+    return await db.run_sync(lambda s: _to_schemas(schemas.Budget, crud.get_budgets(s, user_id)))
+
+async def create_budget(db: AsyncSession, budget: schemas.BudgetCreate, user_id: int):
+    return await db.run_sync(lambda s: _to_schema(schemas.Budget, crud.create_budget(s, budget, user_id)))
+
+async def update_budget(db: AsyncSession, budget_id: int, budget: schemas.BudgetBase, user_id: int):
+    return await db.run_sync(lambda s: _to_schema(schemas.Budget, crud.update_budget(s, budget_id, budget, user_id)))
+
+async def delete_budget(db: AsyncSession, budget_id: int, user_id: int):
+    return await db.run_sync(lambda s: crud.delete_budget(s, budget_id, user_id) is not None)
+
+async def get_budget_status(db: AsyncSession, user_id: int):
+    return await _cached(db, "budget_status", user_id, None, lambda s: crud.get_budget_status(s, user_id))
+
+
+# ============ CATEGORIES ============
+
+async def get_categories(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100):
+    return await db.run_sync(lambda s: _to_schemas(schemas.Category, crud.get_categories(s, user_id, skip, limit)))
+
+async def create_category(db: AsyncSession, category: schemas.CategoryCreate, user_id: int):
+    return await db.run_sync(lambda s: _to_schema(schemas.Category, crud.create_category(s, category, user_id)))
+
+async def delete_category(db: AsyncSession, category_id: int, user_id: int):
+    return await db.run_sync(crud.delete_category, category_id, user_id)
+
+
+# ============ SUMMARY & ANALYTICS ============
+
+async def get_summary(db: AsyncSession, user_id: int, moeda: str = None):
+    return await _cached(db, "summary", user_id, [moeda], lambda s: crud.get_summary(s, user_id, moeda))
+
+async def get_category_analytics(db: AsyncSession, user_id: int, period: str = None, moeda: str = None):
+    return await _cached(db, "analytics", user_id, [period, moeda],
+                         lambda s: crud.get_category_analytics(s, user_id, period, moeda))
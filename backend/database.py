@@ -1,5 +1,6 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -20,16 +21,176 @@ if not DATABASE_URL:
 else:
     SQLALCHEMY_DATABASE_URL = DATABASE_URL
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# ============ PERFIL DE CONEXÃO ============
+# SQLite: WAL deixa leituras (dashboard) concorrerem com escritas (n8n) e busy_timeout
+# faz o escritor esperar o lock em vez de falhar com "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negativo = KiB (64 MiB)
+    "temp_store": "MEMORY",
+}
+
+# Postgres (ou outro servidor): pool por processo/worker
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.endswith(":memory:") or url.rstrip("/").endswith("sqlite:")
+
+
+def sqlite_pragmas(url: str) -> dict:
+    """PRAGMAs efetivos para a URL (WAL não se aplica a bancos em memória)"""
+    pragmas = {k: v for k, v in SQLITE_PRAGMAS.items() if v not in (None, "")}
+    if _is_memory_sqlite(url):
+        pragmas.pop("journal_mode", None)
+    return pragmas
+
+
+def engine_options(url: str) -> dict:
+    """Argumentos de create_engine conforme o banco"""
+    if _is_sqlite(url):
+        # timeout do driver em segundos, alinhado com busy_timeout
+        return {
+            "connect_args": {
+                "check_same_thread": False,
+                "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000,
+            },
+        }
+    return {
+        "pool_size": POOL_SIZE,
+        "max_overflow": POOL_MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _install_pragmas(sync_engine, url: str):
+    """Aplica os PRAGMAs a cada conexão nova do pool"""
+    if not _is_sqlite(url):
+        return
+    pragmas = sqlite_pragmas(url)
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def make_engine(url: str = None):
+    """Engine síncrono com o perfil de conexão"""
+    url = url or SQLALCHEMY_DATABASE_URL
+    eng = create_engine(url, **engine_options(url))
+    _install_pragmas(eng, url)
+    return eng
+
+
+def make_async_engine(url: str = None):
+    """Engine assíncrono (aiosqlite / asyncpg) com o mesmo perfil"""
+    url = url or SQLALCHEMY_DATABASE_URL
+    eng = create_async_engine(async_database_url(url), **engine_options(url))
+    _install_pragmas(eng.sync_engine, url)
+    return eng
+
+
+# Driver síncrono da DATABASE_URL -> driver assíncrono equivalente
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "sqlite+aiosqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgresql+asyncpg": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url: str) -> str:
+    """URL equivalente com driver assíncrono (aiosqlite / asyncpg).
+    Bancos sem driver assíncrono mapeado levantam ValueError com a causa."""
+    from sqlalchemy.engine import make_url
+
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    if driver is None:
+        raise ValueError(
+            f"DATABASE_URL com driver '{parsed.drivername}' sem equivalente assíncrono; "
+            f"suportados: {', '.join(sorted(ASYNC_DRIVERS))}"
+        )
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine assíncrono para as rotas async (mesmo banco do engine síncrono), criado no
+# primeiro uso: scripts e migrações que só usam o engine síncrono não dependem do driver async
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        _async_engine = make_async_engine()
+        _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+def AsyncSessionLocal():
+    get_async_engine()
+    return _async_sessionmaker()
+
+
+def dispose_engines():
+    """Descarta as conexões herdadas (gunicorn post_fork com preload)"""
+    engine.dispose(close=False)
+    if _async_engine is not None:
+        _async_engine.sync_engine.dispose(close=False)
+
 Base = declarative_base()
 
+
+def upsert_increment(db, table, rows: list, index_elements: list, incrementar: list):
+    """INSERT ... ON CONFLICT DO UPDATE somando as colunas incrementar (col = col + excluded.col).
+    Incremento atômico no banco, sem ler-modificar-escrever em Python. SQLite e Postgres."""
+    dialeto = db.get_bind().dialect.name
+    if dialeto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialeto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise NotImplementedError(f"upsert sem suporte para {dialeto}")
+    stmt = insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c[c] for c in index_elements],
+        set_={c: table.c[c] + stmt.excluded[c] for c in incrementar},
+    )
+    return db.execute(stmt)
+
 def get_db():
+    """Dependência única de sessão síncrona (rotas e auth)"""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
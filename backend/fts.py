@@ -0,0 +1,105 @@
+"""
+Índice full-text (SQLite FTS5) das descrições e categorias de transações.
+
+A tabela virtual usa a própria tabela transactions como conteúdo externo e
+é mantida em sincronia por triggers, então create/update/delete em crud.py
+(e qualquer outra escrita) atualizam o índice na mesma transação.
+Em bancos sem FTS5 (ou não SQLite) a busca volta para ILIKE.
+
+Reconstruir o índice manualmente:
+
+    python -m backend.fts
+"""
+import re
+from sqlalchemy import column, table, text
+from sqlalchemy.exc import OperationalError
+
+FTS_TABLE = "transactions_fts"
+
+# Referência para joins/ordenação: rowid = transactions.id, rank = bm25
+transactions_fts = table(FTS_TABLE, column("rowid"), column("rank"), column(FTS_TABLE))
+
+_DDL = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        description, category,
+        content='transactions', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description, category) VALUES (new.id, new.description, new.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, category) VALUES ('delete', old.id, old.description, old.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description, category ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, category) VALUES ('delete', old.id, old.description, old.category);
+        INSERT INTO {FTS_TABLE}(rowid, description, category) VALUES (new.id, new.description, new.category);
+    END""",
+]
+
+_enabled = {}  # url do engine -> bool
+
+
+def ensure_fts_index(engine) -> bool:
+    """Cria o índice e os triggers se ainda não existirem (populando a partir das transações)"""
+    if engine.dialect.name != "sqlite":
+        _enabled[str(engine.url)] = False
+        return False
+
+    with engine.begin() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+        ).first()
+        if not exists:
+            try:
+                for ddl in _DDL:
+                    conn.exec_driver_sql(ddl)
+                conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            except OperationalError as e:
+                # SQLite compilado sem FTS5
+                print(f"[AVISO] Índice full-text indisponível: {e}")
+                _enabled[str(engine.url)] = False
+                return False
+
+    _enabled[str(engine.url)] = True
+    return True
+
+
+def is_enabled(db) -> bool:
+    """True se o banco da sessão tem o índice full-text"""
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _enabled:
+        if bind.dialect.name != "sqlite":
+            _enabled[key] = False
+        else:
+            _enabled[key] = db.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+            ).first() is not None
+    return _enabled[key]
+
+
+def build_match_query(busca: str):
+    """Converte texto livre em consulta FTS5 com prefixo por termo ("uber mer" -> "uber"* "mer"*)"""
+    termos = re.findall(r"\w+", busca or "")
+    if not termos:
+        return None
+    return " ".join(f'"{t}"*' for t in termos)
+
+
+def rebuild(engine):
+    """Reconstrói o índice a partir da tabela transactions"""
+    if not ensure_fts_index(engine):
+        return False
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return True
+
+
+if __name__ == "__main__":
+    from .database import engine
+    if rebuild(engine):
+        print("✅ Índice full-text reconstruído.")
+    else:
+        print("⚠️  Índice full-text indisponível neste banco.")
@@ -0,0 +1,164 @@
+"""
+Câmbio: tabela local de cotações (exchange_rates) e conversão de totais.
+
+Cada cotação é "unidades da moeda por 1 USD" numa data, então a conversão
+entre duas moedas quaisquer usa o USD como pivô:
+
+    valor_destino = valor_origem * taxa(destino, dia) / taxa(origem, dia)
+
+A taxa de um dia é a última cotação publicada até ele (fins de semana e
+feriados usam a anterior); antes da primeira cotação usa-se a primeira.
+As séries por moeda ficam em memória por (moeda, versão global): a carga
+de cotações incrementa a versão global (response_cache), então nenhum
+worker usa uma série anterior a ela. Os agregados convertem linhas já
+agrupadas por (moeda, data), não transação por transação. Moeda sem
+cotação não derruba os agregados: o total entra sem conversão e a moeda é
+devolvida ao chamador (convert_totals com sem_cotacao) para sinalizar.
+
+Carregar cotações de um CSV (colunas: date,currency,rate):
+
+    python -m backend.fx cotacoes.csv
+"""
+import argparse
+import bisect
+import csv
+import os
+from datetime import date
+from decimal import Decimal
+from sqlalchemy.orm import Session
+from . import models, response_cache
+from .cache import TTLCache
+
+PIVOT_CURRENCY = "USD"
+DEFAULT_CURRENCY = os.getenv("DEFAULT_CURRENCY", "COP")
+
+# (moeda, versão global) -> (datas ordenadas, taxas)
+_series_cache = TTLCache(
+    maxsize=int(os.getenv("FX_CACHE_SIZE", "64")),
+    ttl=float(os.getenv("FX_CACHE_TTL", "3600")),
+)
+
+
+class MissingRateError(ValueError):
+    """Não há cotação carregada para a moeda"""
+
+    def __init__(self, currency: str):
+        super().__init__(f"No hay tasa de cambio cargada para {currency}")
+        self.currency = currency
+
+
+def normalize_currency(currency) -> str:
+    """Código ISO 4217 em maiúsculas (None/vazio -> None)"""
+    return currency.strip().upper() if currency and currency.strip() else None
+
+
+def invalidate_rates():
+    """Descarta as séries em memória (após carregar cotações)"""
+    _series_cache.clear()
+
+
+def _series(db: Session, currency: str, versao: int = None):
+    if versao is None:
+        versao = response_cache.versions(db)[response_cache.GLOBAL_FAMILY]
+    series = _series_cache.get((currency, versao))
+    if series is None:
+        rows = db.query(models.ExchangeRate.date, models.ExchangeRate.rate).filter(
+            models.ExchangeRate.currency == currency
+        ).order_by(models.ExchangeRate.date).all()
+        series = ([r[0] for r in rows], [Decimal(str(r[1])) for r in rows])
+        _series_cache.set((currency, versao), series)
+    return series
+
+
+def rate_on(db: Session, currency: str, dia: date, versao: int = None) -> Decimal:
+    """Unidades de currency por 1 USD em dia (versao: versão global já lida)"""
+    if currency == PIVOT_CURRENCY:
+        return Decimal(1)
+    datas, taxas = _series(db, currency, versao)
+    if not datas:
+        raise MissingRateError(currency)
+    i = bisect.bisect_right(datas, dia) - 1
+    return taxas[max(i, 0)]
+
+
+def convert_totals(db: Session, linhas, destino: str, sem_cotacao: set = None) -> list:
+    """Converte [(moeda, dia, total)] para destino; devolve os totais convertidos na mesma ordem.
+
+    Cada (moeda, dia) distinto consulta a série uma vez; a versão global é lida uma vez.
+    Sem cotação para a origem ou o destino: com sem_cotacao, o total fica sem
+    conversão e a moeda sem cotação é adicionada ao conjunto; sem ele, MissingRateError.
+    """
+    destino = normalize_currency(destino) or DEFAULT_CURRENCY
+    fatores = {}
+    versao = None
+    convertidos = []
+    for moeda, dia, total in linhas:
+        moeda = normalize_currency(moeda) or destino
+        if moeda == destino:
+            convertidos.append(models.as_money(total))
+            continue
+        fator = fatores.get((moeda, dia))
+        if fator is None:
+            if versao is None:
+                versao = response_cache.versions(db)[response_cache.GLOBAL_FAMILY]
+            try:
+                fator = rate_on(db, destino, dia, versao) / rate_on(db, moeda, dia, versao)
+            except MissingRateError as e:
+                if sem_cotacao is None:
+                    raise
+                sem_cotacao.add(e.currency)
+                fator = Decimal(1)
+            fatores[(moeda, dia)] = fator
+        convertidos.append(models.as_money(Decimal(str(total)) * fator))
+    return convertidos
+
+
+def load_rates(db: Session, rows) -> int:
+    """Grava cotações [(data, moeda, taxa)] (substitui a mesma moeda/data) e invalida o cache"""
+    rows = [(d, normalize_currency(c), float(r)) for d, c, r in rows]
+    if not rows:
+        return 0
+    existentes = {
+        (r.currency, r.date): r
+        for r in db.query(models.ExchangeRate).filter(
+            models.ExchangeRate.currency.in_({c for _, c, _ in rows}),
+            models.ExchangeRate.date >= min(d for d, _, _ in rows),
+            models.ExchangeRate.date <= max(d for d, _, _ in rows),
+        )
+    }
+    for dia, moeda, taxa in rows:
+        row = existentes.get((moeda, dia))
+        if row is None:
+            row = existentes[(moeda, dia)] = models.ExchangeRate(currency=moeda, date=dia)
+            db.add(row)
+        row.rate = taxa
+    response_cache.bump(db, [response_cache.GLOBAL_FAMILY])
+    db.commit()
+    invalidate_rates()
+    return len(rows)
+
+
+def read_rates_csv(stream):
+    """Lê (data, moeda, taxa) de um CSV com cabeçalho date,currency,rate"""
+    for linha in csv.DictReader(stream):
+        yield date.fromisoformat(linha["date"].strip()), linha["currency"], linha["rate"].strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("arquivo", help="CSV com colunas date,currency,rate (unidades por 1 USD)")
+    parser.add_argument("--encoding", default="utf-8-sig")
+    args = parser.parse_args()
+
+    from .database import SessionLocal
+    db = SessionLocal()
+    try:
+        with open(args.arquivo, encoding=args.encoding, newline="") as f:
+            total = load_rates(db, list(read_rates_csv(f)))
+    finally:
+        db.close()
+
+    print(f"✅ {total} cotações carregadas.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Importação de extratos bancários (CSV e OFX) em streaming.
+
+O arquivo é lido linha a linha (CSV) ou por tags (OFX) e gravado em blocos
+de CHUNK_SIZE com um commit por bloco. Além do bloco atual fica em memória só
+o contador de ocorrências do dia corrente (extratos vêm ordenados por data; o
+contador é zerado quando a data muda), então a memória não cresce com o
+tamanho do arquivo. Cada linha recebe um import_hash de
+(user_id, data, valor, descrição normalizada, ocorrência) e linhas cujo hash
+já existe para o usuário são ignoradas — reimportar o mesmo extrato (ou um
+extrato que se sobrepõe ao anterior) não duplica transações, nem com duas
+importações simultâneas (o índice único decide e o bloco é refeito). A ocorrência
+distingue lançamentos idênticos legítimos do mesmo dia dentro do extrato.
+
+    python -m backend.importer extrato.csv --user admin
+    python -m backend.importer extrato.ofx --user admin --rules regras.json
+
+Pela API: POST /transactions/import (upload multipart, campo "arquivo").
+"""
+
+import argparse
+import csv
+import hashlib
+import html
+import io
+import json
+import math
+import re
+import unicodedata
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import crud, schemas
+
+CHUNK_SIZE = 500
+MAX_ERROS = 50  # erros detalhados devolvidos no resumo
+
+# Regras padrão (regex sobre a descrição normalizada -> categoria). A primeira que casar vence.
+CATEGORY_RULES = [
+    (r"\b(uber|didi|cabify|taxi|peaje|gasolina|terpel|transmilenio|metro)\b", "Transporte"),
+    (r"\b(exito|carulla|jumbo|olimpica|ara|d1|mercado|restaurante|rappi|panaderia)\b", "Alimentación"),
+    (r"\b(arriendo|administracion|hipoteca)\b", "Vivienda"),
+    (r"\b(netflix|spotify|disney|cine|hbo|prime video)\b", "Entretenimiento"),
+    (r"\b(farmacia|drogueria|eps|medico|clinica|hospital)\b", "Salud"),
+    (r"\b(colegio|universidad|matricula|curso)\b", "Educación"),
+    (r"\b(epm|codensa|enel|acueducto|claro|movistar|tigo|etb|internet|energia|gas natural)\b", "Servicios"),
+    (r"\b(nomina|salario|sueldo|pago nomina)\b", "Salario"),
+]
+DEFAULT_CATEGORY = "Otros"
+
+# Cabeçalhos reconhecidos no CSV (normalizados)
+_CSV_COLUMNS = {
+    "date": ("fecha", "date", "data", "fecha transaccion", "fecha de transaccion", "fecha movimiento"),
+    "description": ("descripcion", "description", "descricao", "concepto", "detalle", "referencia", "memo"),
+    "amount": ("valor", "monto", "amount", "importe", "valor transaccion"),
+    "debit": ("debito", "debit", "cargo", "retiro", "salida"),
+    "credit": ("credito", "credit", "abono", "deposito", "entrada"),
+    "category": ("categoria", "category"),
+    "type": ("tipo", "type"),
+    "currency": ("moneda", "currency", "divisa", "moeda"),
+}
+# Valores da coluna tipo que indicam despesa (valor positivo vira negativo)
+_EXPENSE_TYPES = ("gasto", "expense", "egreso", "debito", "despesa")
+_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d", "%d.%m.%Y", "%Y%m%d")
+
+
+def normalize_description(texto: str) -> str:
+    """Minúsculas, sem acentos, só letras/dígitos separados por um espaço"""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    return " ".join(re.findall(r"[a-z0-9]+", texto))
+
+
+def import_hash(user_id: int, data: date, valor: float, descricao: str, ocorrencia: int = 0) -> str:
+    chave = f"{user_id}|{data.isoformat()}|{valor:.2f}|{normalize_description(descricao)}|{ocorrencia}"
+    return hashlib.sha1(chave.encode("utf-8")).hexdigest()
+
+
+def compile_rules(rules=None, categorias_usuario=()):
+    """Regras (regex, categoria): as do arquivo/parâmetro primeiro, depois as categorias
+    do usuário (nome contido na descrição) e por fim CATEGORY_RULES"""
+    compiladas = [(re.compile(p, re.IGNORECASE), c) for p, c in (rules or [])]
+    for nome in categorias_usuario:
+        termo = normalize_description(nome)
+        if termo:
+            compiladas.append((re.compile(rf"\b{re.escape(termo)}\b"), nome))
+    compiladas.extend((re.compile(p), c) for p, c in CATEGORY_RULES)
+    return compiladas
+
+
+def categorize(descricao: str, rules) -> str:
+    normalizada = normalize_description(descricao)
+    for padrao, categoria in rules:
+        if padrao.search(normalizada):
+            return categoria
+    return DEFAULT_CATEGORY
+
+
+def parse_amount(texto) -> float:
+    """Valores como "-1.234.567,89", "1,234.56", "$ 45.000", "(300.00)". NaN/infinito: ValueError"""
+    if texto is None:
+        raise ValueError("valor vazio")
+    if isinstance(texto, (int, float)):
+        if not math.isfinite(texto):
+            raise ValueError(f"valor inválido: {texto!r}")
+        return float(texto)
+    s = texto.strip().replace("$", "").replace(" ", "").replace("\xa0", "")
+    negativo = s.startswith("(") and s.endswith(")")
+    s = s.strip("()")
+    if not s:
+        raise ValueError("valor vazio")
+    if "," in s and "." in s:
+        # O último separador é o decimal
+        if s.rfind(",") > s.rfind("."):
+            s = s.replace(".", "").replace(",", ".")
+        else:
+            s = s.replace(",", "")
+    elif "," in s:
+        inteiro, _, decimais = s.rpartition(",")
+        s = f"{inteiro.replace(',', '')}.{decimais}" if len(decimais) != 3 else s.replace(",", "")
+    elif s.count(".") > 1 or re.fullmatch(r"-?\d{1,3}\.\d{3}", s):
+        # Separador de milhar com ponto (padrão COP)
+        s = s.replace(".", "")
+    try:
+        valor = float(Decimal(s))
+    except InvalidOperation:
+        raise ValueError(f"valor inválido: {texto!r}")
+    if not math.isfinite(valor):
+        raise ValueError(f"valor inválido: {texto!r}")
+    return -valor if negativo else valor
+
+
+def parse_date(texto: str) -> date:
+    texto = (texto or "").strip()
+    # OFX: 20260115120000[-5:EST]
+    if re.match(r"^\d{8}", texto) and not re.match(r"^\d{4}-", texto):
+        texto = texto[:8]
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(texto, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"data inválida: {texto!r}")
+
+
+# ============ PARSERS ============
+
+def _map_csv_header(header):
+    normalizados = [normalize_description(h) for h in header]
+    mapa = {}
+    for campo, nomes in _CSV_COLUMNS.items():
+        for i, h in enumerate(normalizados):
+            if h in nomes:
+                mapa[campo] = i
+                break
+    if "date" not in mapa or "description" not in mapa or not ({"amount", "debit", "credit"} & mapa.keys()):
+        raise ValueError(f"Cabeçalho CSV não reconhecido: {header}")
+    return mapa
+
+
+def iter_csv(stream):
+    """Gera dicts {date, description, amount, category, currency} a partir de um CSV em texto.
+    amount < 0 (ou coluna tipo = gasto/expense) = despesa. Delimitador detectado pela primeira linha (, ; ou tab)."""
+    primeira = stream.readline()
+    if not primeira:
+        return
+    try:
+        delimitador = csv.Sniffer().sniff(primeira, delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimitador = ","
+    header = next(csv.reader([primeira], delimiter=delimitador))
+    mapa = _map_csv_header(header)
+
+    for row in csv.reader(stream, delimiter=delimitador):
+        if not any(c.strip() for c in row):
+            continue
+        get = lambda campo: row[mapa[campo]] if campo in mapa and mapa[campo] < len(row) else ""
+        try:
+            if "amount" in mapa and get("amount").strip():
+                valor = parse_amount(get("amount"))
+            else:
+                debito = get("debit").strip()
+                credito = get("credit").strip()
+                valor = parse_amount(credito) if credito else -abs(parse_amount(debito))
+            if normalize_description(get("type")) in _EXPENSE_TYPES:
+                valor = -abs(valor)
+            yield {
+                "date": parse_date(get("date")),
+                "description": get("description").strip(),
+                "amount": valor,
+                "category": get("category").strip() or None,
+                "currency": get("currency").strip() or None,
+            }
+        except ValueError as e:
+            yield e
+
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+def _iter_ofx_tags(stream, bloco=64 * 1024):
+    """Tokens (fechamento, tag, valor) lidos em blocos; funciona com OFX SGML e XML"""
+    resto = ""
+    while True:
+        dados = stream.read(bloco)
+        if not dados:
+            break
+        resto += dados
+        corte = resto.rfind("<")
+        if corte <= 0:
+            continue
+        for m in _OFX_TAG.finditer(resto, 0, corte):
+            yield m.group(1) == "/", m.group(2).upper(), html.unescape(m.group(3).strip())
+        resto = resto[corte:]
+    for m in _OFX_TAG.finditer(resto):
+        yield m.group(1) == "/", m.group(2).upper(), html.unescape(m.group(3).strip())
+
+
+def iter_ofx(stream):
+    """Gera dicts {date, description, amount, category, currency} para cada <STMTTRN> de um OFX.
+    A moeda vem do <CURDEF> do extrato (antes das transações)."""
+    atual = None
+    moeda = None
+    for fechamento, tag, valor in _iter_ofx_tags(stream):
+        if tag == "STMTTRN":
+            if not fechamento:
+                if atual:
+                    yield _ofx_row(atual, moeda)
+                atual = {}
+                continue
+            if atual is not None:
+                yield _ofx_row(atual, moeda)
+            atual = None
+        elif tag == "CURDEF" and not fechamento and valor.strip():
+            moeda = valor.strip()
+        elif atual is not None and not fechamento and valor:
+            atual[tag] = valor
+    if atual:
+        yield _ofx_row(atual, moeda)
+
+
+def _ofx_row(campos, moeda=None):
+    try:
+        descricao = campos.get("NAME") or campos.get("MEMO") or campos.get("TRNTYPE", "")
+        if campos.get("NAME") and campos.get("MEMO") and campos["MEMO"] != campos["NAME"]:
+            descricao = f"{campos['NAME']} {campos['MEMO']}"
+        return {
+            "date": parse_date(campos.get("DTPOSTED", "")),
+            "description": descricao.strip(),
+            "amount": parse_amount(campos.get("TRNAMT")),
+            "category": None,
+            "currency": moeda,
+        }
+    except ValueError as e:
+        return e
+
+
+PARSERS = {"csv": iter_csv, "ofx": iter_ofx}
+
+
+def detect_format(nome_arquivo: str) -> str:
+    return "ofx" if (nome_arquivo or "").lower().endswith((".ofx", ".qfx")) else "csv"
+
+
+# ============ IMPORTAÇÃO ============
+
+def import_statement(db: Session, stream, formato: str, user_id: int, rules=None, chunk_size: int = CHUNK_SIZE) -> dict:
+    """Importa um extrato (stream de texto) para o usuário. Retorna o resumo da importação."""
+    regras = compile_rules(rules, [c.name for c in crud.get_categories(db, user_id, limit=1000)])
+    resumo = {"lidas": 0, "criadas": 0, "duplicadas": 0, "erros": 0, "detalhes_erros": []}
+    ocorrencias = {}  # (valor, descrição) -> contagem, só do dia em dia_atual
+    dia_atual = None
+    bloco = []  # (hash, TransactionCreate)
+
+    def gravar():
+        if not bloco:
+            return
+        hashes = [h for h, _ in bloco]
+        existentes = crud.get_existing_import_hashes(db, user_id, hashes)
+        while True:
+            novos = [(h, t) for h, t in bloco if h not in existentes]
+            try:
+                if novos:
+                    crud.create_transactions_batch(db, [t for _, t in novos], user_id, import_hashes=[h for h, _ in novos])
+                break
+            except IntegrityError:
+                # Outra importação gravou hashes do bloco entre a consulta e o INSERT:
+                # refaz sem eles (se nenhum hash novo apareceu, o erro é outro)
+                db.rollback()
+                atualizados = crud.get_existing_import_hashes(db, user_id, hashes)
+                if atualizados == existentes:
+                    raise
+                existentes = atualizados
+        resumo["criadas"] += len(novos)
+        resumo["duplicadas"] += len(bloco) - len(novos)
+        bloco.clear()
+
+    for linha, row in enumerate(PARSERS[formato](stream), start=1):
+        resumo["lidas"] += 1
+        if isinstance(row, Exception):
+            resumo["erros"] += 1
+            if len(resumo["detalhes_erros"]) < MAX_ERROS:
+                resumo["detalhes_erros"].append({"linha": linha, "erro": str(row)})
+            continue
+
+        if row["date"] != dia_atual:
+            ocorrencias.clear()
+            dia_atual = row["date"]
+        chave = (round(row["amount"], 2), normalize_description(row["description"]))
+        ocorrencia = ocorrencias.get(chave, 0)
+        ocorrencias[chave] = ocorrencia + 1
+
+        valor = row["amount"]
+        bloco.append((
+            import_hash(user_id, row["date"], valor, row["description"], ocorrencia),
+            schemas.TransactionCreate(
+                description=row["description"] or DEFAULT_CATEGORY,
+                amount=abs(valor),
+                type="expense" if valor < 0 else "income",
+                category=row["category"] or categorize(row["description"], regras),
+                date=row["date"],
+                currency=row["currency"],
+            ),
+        ))
+        if len(bloco) >= chunk_size:
+            gravar()
+    gravar()
+    return resumo
+
+
+def load_rules(caminho: str):
+    """Arquivo JSON com [[regex, categoria], ...] ou {regex: categoria}"""
+    with open(caminho, encoding="utf-8") as f:
+        dados = json.load(f)
+    return list(dados.items()) if isinstance(dados, dict) else [tuple(r) for r in dados]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("arquivo")
+    parser.add_argument("--user", required=True, help="username do dono das transações")
+    parser.add_argument("--format", choices=sorted(PARSERS), help="padrão: pela extensão do arquivo")
+    parser.add_argument("--encoding", default="utf-8-sig")
+    parser.add_argument("--rules", help="JSON com regras de categoria")
+    args = parser.parse_args()
+
+    from .database import SessionLocal
+    db = SessionLocal()
+    try:
+        user = crud.get_user_by_username(db, args.user)
+        if not user:
+            raise SystemExit(f"❌ Usuário '{args.user}' não encontrado")
+        rules = load_rules(args.rules) if args.rules else None
+        with io.open(args.arquivo, encoding=args.encoding, errors="replace", newline="") as f:
+            resumo = import_statement(db, f, args.format or detect_format(args.arquivo), user.id, rules)
+    finally:
+        db.close()
+
+    print(f"✅ Lidas: {resumo['lidas']} | criadas: {resumo['criadas']} | "
+          f"duplicadas: {resumo['duplicadas']} | erros: {resumo['erros']}")
+    for erro in resumo["detalhes_erros"]:
+        print(f"   linha {erro['linha']}: {erro['erro']}")
+
+if __name__ == "__main__":
+    main()
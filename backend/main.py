@@ -2,28 +2,34 @@ import os
 from dotenv import load_dotenv
 
 load_dotenv()
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from . import models, database, routes, auth
-
-# Ensure data directory exists
-if not os.path.exists("data"):
-    os.makedirs("data")
-
-# Create tables
-models.Base.metadata.create_all(bind=database.engine)
-
-# Create default admin user
-db = database.SessionLocal()
-try:
-    auth.create_default_admin(db)
-except Exception as e:
-    print(f"[AVISO] Error creating admin user: {e}")
-finally:
-    db.close()
-
-app = FastAPI(title="Agente Financeiro API", description="API para App Financeiro Colombiano", version="1.0.0")
+from . import auth, database, routes, scheduler, startup
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Engine async das rotas: URL sem driver assíncrono falha aqui, não na primeira requisição
+    database.get_async_engine()
+    # Pool de hash de senhas do worker, antes de qualquer thread (ver backend/auth.py)
+    auth.start_hash_pool()
+    # Startup serializado entre workers (ver backend/startup.py)
+    if os.getenv("SKIP_STARTUP_INIT", "").lower() not in ("1", "true", "yes"):
+        await run_in_threadpool(startup.run_startup)
+    # Recorrentes aplicadas em segundo plano (um worker por vez)
+    agendador = scheduler.BackgroundScheduler() if scheduler.SCHEDULER_ENABLED else None
+    if agendador:
+        agendador.start()
+    yield
+    if agendador:
+        agendador.stop()
+    auth.shutdown_hash_pool()
+
+
+app = FastAPI(title="Agente Financeiro API", description="API para App Financeiro Colombiano", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
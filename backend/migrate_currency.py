@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Script de migração para a moeda por transação:
+- coluna transactions.currency, preenchida com a moeda do dono (users.currency)
+- monthly_rollups recriada com currency na chave e recalculada
+
+A tabela exchange_rates é criada pelo create_all na subida da API; as
+cotações são carregadas com python -m backend.fx cotacoes.csv.
+Execute no VPS após backend.migrate_money:
+
+    python -m backend.migrate_currency
+
+Ou diretamente:
+
+    python backend/migrate_currency.py
+"""
+
+import os
+import sqlite3
+
+# Localizar o banco de dados
+DB_PATH = os.getenv("DATABASE_URL", "").replace("sqlite:///", "") or "data/financeiro.db"
+DEFAULT_CURRENCY = os.getenv("DEFAULT_CURRENCY", "COP")
+
+
+def migrate():
+    print(f"[migração] Conectando ao banco: {DB_PATH}")
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    cursor.execute("PRAGMA table_info(transactions)")
+    columns = [row[1] for row in cursor.fetchall()]
+
+    if "currency" not in columns:
+        cursor.execute("ALTER TABLE transactions ADD COLUMN currency VARCHAR(3)")
+        print("[migração] ✅ Coluna 'currency' adicionada")
+    else:
+        print("[migração] ⚠️  Coluna 'currency' já existe")
+
+    cursor.execute("""
+        UPDATE transactions SET currency = (
+            SELECT UPPER(COALESCE(NULLIF(TRIM(u.currency), ''), ?)) FROM users u WHERE u.id = transactions.user_id
+        )
+        WHERE currency IS NULL
+    """, (DEFAULT_CURRENCY,))
+    print(f"[migração] ✅ Moeda preenchida em {cursor.rowcount} transações")
+
+    cursor.execute("PRAGMA table_info(monthly_rollups)")
+    rollup_columns = [row[1] for row in cursor.fetchall()]
+    if "currency" in rollup_columns:
+        print("[migração] ⚠️  monthly_rollups já tem 'currency'")
+    else:
+        # SQLite não altera UNIQUE: recriar a tabela com a chave nova
+        cursor.execute("DROP TABLE IF EXISTS monthly_rollups")
+        cursor.execute("""
+            CREATE TABLE monthly_rollups (
+                id INTEGER NOT NULL PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users (id),
+                year_month VARCHAR NOT NULL,
+                type VARCHAR,
+                category VARCHAR,
+                currency VARCHAR(3),
+                total BIGINT,
+                count INTEGER,
+                CONSTRAINT uq_monthly_rollups_key UNIQUE (user_id, year_month, type, category, currency)
+            )
+        """)
+        cursor.execute("CREATE INDEX ix_monthly_rollups_id ON monthly_rollups (id)")
+        # amount já está em centavos (migrate_money): a soma vai direto para total
+        cursor.execute("""
+            INSERT INTO monthly_rollups (user_id, year_month, type, category, currency, total, count)
+            SELECT user_id, strftime('%Y-%m', date), type, category, currency, COALESCE(SUM(amount), 0), COUNT(id)
+            FROM transactions
+            WHERE date IS NOT NULL
+            GROUP BY user_id, strftime('%Y-%m', date), type, category, currency
+        """)
+        print(f"[migração] ✅ monthly_rollups recriada por moeda ({cursor.rowcount} linhas)")
+
+    conn.commit()
+    conn.close()
+    print("[migração] ✅ Migração concluída com sucesso!")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Script de migração para a deduplicação de extratos importados
+(coluna transactions.import_hash + índice único por usuário).
+Execute no VPS após atualizar o código:
+
+    python -m backend.migrate_import_hash
+
+Ou diretamente:
+
+    python backend/migrate_import_hash.py
+"""
+
+import os
+import sqlite3
+
+# Localizar o banco de dados
+DB_PATH = os.getenv("DATABASE_URL", "").replace("sqlite:///", "") or "data/financeiro.db"
+
+
+def migrate():
+    print(f"[migração] Conectando ao banco: {DB_PATH}")
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    cursor.execute("PRAGMA table_info(transactions)")
+    columns = [row[1] for row in cursor.fetchall()]
+
+    if "import_hash" not in columns:
+        cursor.execute("ALTER TABLE transactions ADD COLUMN import_hash VARCHAR")
+        print("[migração] ✅ Coluna 'import_hash' adicionada")
+    else:
+        print("[migração] ⚠️  Coluna 'import_hash' já existe")
+
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_transactions_user_import_hash "
+        "ON transactions (user_id, import_hash)"
+    )
+    print("[migração] ✅ Índice 'ix_transactions_user_import_hash' garantido")
+
+    conn.commit()
+    conn.close()
+    print("[migração] ✅ Migração concluída com sucesso!")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Script de migração para criar os índices compostos de transações.
+Execute no VPS após atualizar o código:
+
+    python -m backend.migrate_indexes
+
+Ou diretamente:
+
+    python backend/migrate_indexes.py
+"""
+
+import os
+import sqlite3
+
+# Localizar o banco de dados
+DB_PATH = os.getenv("DATABASE_URL", "").replace("sqlite:///", "") or "data/financeiro.db"
+
+# Conjunto gerenciado — manter em sincronia com models.Transaction.__table_args__
+INDEXES = [
+    ("ix_transactions_user_date", "transactions", ["user_id", "date"]),
+    ("ix_transactions_user_category_type_date", "transactions", ["user_id", "category", "type", "date"]),
+]
+
+
+def create_indexes(conn):
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    existing = {row[0] for row in cursor.fetchall()}
+
+    for name, table, columns in INDEXES:
+        if name not in existing:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+            print(f"[migração] ✅ Índice '{name}' criado")
+        else:
+            print(f"[migração] ⚠️  Índice '{name}' já existe")
+
+    # Atualizar estatísticas para o planner escolher os novos índices
+    cursor.execute("ANALYZE transactions")
+    conn.commit()
+
+
+def migrate():
+    print(f"[migração] Conectando ao banco: {DB_PATH}")
+    conn = sqlite3.connect(DB_PATH)
+    create_indexes(conn)
+    conn.close()
+    print("[migração] ✅ Migração concluída com sucesso!")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Script de migração dos valores monetários de FLOAT para inteiro em centavos
+(transactions.amount, budgets.limit_amount, monthly_rollups.total).
+Execute no VPS após atualizar o código e antes de subir a API:
+
+    python -m backend.migrate_money
+
+Ou diretamente:
+
+    python backend/migrate_money.py
+
+Para cada coluna: cria <coluna>_minor BIGINT, copia os valores convertidos
+(Decimal, meio centavo para cima — mesma regra de models.to_minor), remove a
+coluna antiga e renomeia a nova. Requer SQLite 3.35+ (DROP COLUMN).
+"""
+
+import os
+import sqlite3
+from decimal import Decimal, ROUND_HALF_UP
+
+# Localizar o banco de dados
+DB_PATH = os.getenv("DATABASE_URL", "").replace("sqlite:///", "") or "data/financeiro.db"
+
+# Manter em sincronia com as colunas Money de models.py
+MONEY_COLUMNS = [
+    ("transactions", "amount"),
+    ("budgets", "limit_amount"),
+    ("monthly_rollups", "total"),
+]
+
+
+def to_minor(value) -> int:
+    return int((Decimal(str(value)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def column_type(cursor, table, column):
+    cursor.execute(f"PRAGMA table_info({table})")
+    for row in cursor.fetchall():
+        if row[1] == column:
+            return (row[2] or "").upper()
+    return None
+
+
+def migrate_column(conn, table, column, batch=5000):
+    cursor = conn.cursor()
+    tipo = column_type(cursor, table, column)
+    if tipo is None:
+        print(f"[migração] ⚠️  {table}.{column} não existe")
+        return
+    if "INT" in tipo:
+        print(f"[migração] ⚠️  {table}.{column} já está em centavos ({tipo})")
+        return
+
+    nova = f"{column}_minor"
+    if column_type(cursor, table, nova) is None:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {nova} BIGINT")
+
+    leitura = conn.cursor()
+    leitura.execute(f"SELECT id, {column} FROM {table} WHERE {column} IS NOT NULL")
+    total = 0
+    while True:
+        rows = leitura.fetchmany(batch)
+        if not rows:
+            break
+        cursor.executemany(f"UPDATE {table} SET {nova} = ? WHERE id = ?", [(to_minor(v), i) for i, v in rows])
+        total += len(rows)
+
+    cursor.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+    cursor.execute(f"ALTER TABLE {table} RENAME COLUMN {nova} TO {column}")
+    print(f"[migração] ✅ {table}.{column}: {total} valores convertidos para centavos")
+
+
+def migrate():
+    print(f"[migração] Conectando ao banco: {DB_PATH}")
+    if sqlite3.sqlite_version_info < (3, 35, 0):
+        print(f"[migração] ❌ SQLite {sqlite3.sqlite_version} não suporta DROP COLUMN (requer 3.35+)")
+        return False
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        for table, column in MONEY_COLUMNS:
+            migrate_column(conn, table, column)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print("[migração] ✅ Migração concluída com sucesso!")
+    return True
+
+if __name__ == "__main__":
+    migrate()
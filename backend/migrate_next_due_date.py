@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Script de migração para o próximo vencimento dos templates recorrentes
+(coluna transactions.next_due_date + índice), calculado a partir da data
+do template e da última ocorrência gerada. Templates sem ocorrências
+começam no mês atual (sem gerar meses retroativos).
+Execute no VPS após backend.migrate_recurring_links:
+
+    python -m backend.migrate_next_due_date
+
+Ou diretamente:
+
+    python backend/migrate_next_due_date.py
+"""
+
+import calendar
+import os
+import sqlite3
+from datetime import date
+
+# Localizar o banco de dados
+DB_PATH = os.getenv("DATABASE_URL", "").replace("sqlite:///", "") or "data/financeiro.db"
+
+
+def due_in_month(ano: int, mes: int, recurrence_day: int) -> date:
+    """Vencimento no mês (dia limitado ao fim do mês)"""
+    ultimo_dia = calendar.monthrange(ano, mes)[1]
+    return date(ano, mes, min(max(recurrence_day, 1), ultimo_dia))
+
+
+def next_due_date(base: date, recurrence_day: int) -> date:
+    """Vencimento no mês seguinte ao de base"""
+    ano, mes = (base.year + 1, 1) if base.month == 12 else (base.year, base.month + 1)
+    return due_in_month(ano, mes, recurrence_day)
+
+
+def migrate():
+    print(f"[migração] Conectando ao banco: {DB_PATH}")
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    cursor.execute("PRAGMA table_info(transactions)")
+    columns = [row[1] for row in cursor.fetchall()]
+
+    if "next_due_date" not in columns:
+        cursor.execute("ALTER TABLE transactions ADD COLUMN next_due_date DATE")
+        print("[migração] ✅ Coluna 'next_due_date' adicionada")
+    else:
+        print("[migração] ⚠️  Coluna 'next_due_date' já existe")
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_transactions_next_due_date ON transactions (next_due_date)")
+    print("[migração] ✅ Índice 'ix_transactions_next_due_date' garantido")
+
+    cursor.execute("""
+        SELECT t.id, t.date, t.recurrence_day,
+               (SELECT MAX(o.date) FROM transactions o WHERE o.recurring_template_id = t.id)
+        FROM transactions t
+        WHERE t.is_recurring = 1 AND t.recurrence_active = 1
+          AND t.recurrence_day IS NOT NULL AND t.date IS NOT NULL
+    """)
+    updates = []
+    hoje = date.today()
+    for template_id, data, dia, ultima in cursor.fetchall():
+        base = max(date.fromisoformat(d) for d in (data, ultima) if d)
+        vencimento = next_due_date(base, dia)
+        if ultima is None and vencimento < hoje.replace(day=1):
+            # Template nunca aplicado: começa no mês atual, sem retroativos
+            vencimento = due_in_month(hoje.year, hoje.month, dia)
+        updates.append((vencimento.isoformat(), template_id))
+    cursor.executemany("UPDATE transactions SET next_due_date = ? WHERE id = ?", updates)
+    print(f"[migração] ✅ next_due_date calculado para {len(updates)} templates")
+
+    conn.commit()
+    conn.close()
+    print("[migração] ✅ Migração concluída com sucesso!")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Script de migração para o agendador de recorrentes:
+coluna transactions.recurring_template_id + índice e vínculo das
+ocorrências já geradas com seus templates.
+Execute no VPS após atualizar o código (antes de subir a API):
+
+    python -m backend.migrate_recurring_links
+
+Ou diretamente:
+
+    python backend/migrate_recurring_links.py
+"""
+
+import os
+import sqlite3
+
+# Localizar o banco de dados
+DB_PATH = os.getenv("DATABASE_URL", "").replace("sqlite:///", "") or "data/financeiro.db"
+
+
+def migrate():
+    print(f"[migração] Conectando ao banco: {DB_PATH}")
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    cursor.execute("PRAGMA table_info(transactions)")
+    columns = [row[1] for row in cursor.fetchall()]
+
+    if "recurring_template_id" not in columns:
+        cursor.execute("ALTER TABLE transactions ADD COLUMN recurring_template_id INTEGER REFERENCES transactions(id) ON DELETE SET NULL")
+        print("[migração] ✅ Coluna 'recurring_template_id' adicionada")
+    else:
+        print("[migração] ⚠️  Coluna 'recurring_template_id' já existe")
+
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS ix_transactions_recurring_template_date "
+        "ON transactions (recurring_template_id, date)"
+    )
+    print("[migração] ✅ Índice 'ix_transactions_recurring_template_date' garantido")
+
+    # Ocorrências geradas antes do vínculo: mesmo critério da verificação antiga
+    # (usuário, descrição, valor, categoria), posteriores à data do template
+    cursor.execute("""
+        UPDATE transactions
+        SET recurring_template_id = (
+            SELECT t.id FROM transactions t
+            WHERE t.is_recurring = 1
+              AND t.user_id = transactions.user_id
+              AND t.description = transactions.description
+              AND t.amount = transactions.amount
+              AND t.category = transactions.category
+              AND t.date < transactions.date
+            ORDER BY t.id
+            LIMIT 1
+        )
+        WHERE recurring_template_id IS NULL
+          AND (is_recurring = 0 OR is_recurring IS NULL)
+          AND EXISTS (
+            SELECT 1 FROM transactions t
+            WHERE t.is_recurring = 1
+              AND t.user_id = transactions.user_id
+              AND t.description = transactions.description
+              AND t.amount = transactions.amount
+              AND t.category = transactions.category
+              AND t.date < transactions.date
+          )
+    """)
+    print(f"[migração] ✅ {cursor.rowcount} ocorrências vinculadas aos templates")
+
+    conn.commit()
+    conn.close()
+    print("[migração] ✅ Migração concluída com sucesso!")
+
+if __name__ == "__main__":
+    migrate()
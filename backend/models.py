@@ -1,9 +1,48 @@
-from sqlalchemy import Column, Integer, String, Float, Date, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Date, Boolean, DateTime, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship, backref
+from sqlalchemy.types import TypeDecorator
 from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
 from .database import Base
 
 
+# ============ VALORES MONETÁRIOS ============
+
+MINOR_UNITS = 100  # centavos por unidade
+
+
+def to_minor(value) -> int:
+    """Valor (float, Decimal, str) em unidades menores inteiras, arredondando meio centavo para cima.
+    NaN/infinito: ValueError"""
+    valor = Decimal(str(value))
+    if not valor.is_finite():
+        raise ValueError(f"valor monetário inválido: {value!r}")
+    return int((valor * MINOR_UNITS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor(value) -> Decimal:
+    return Decimal(int(value)).scaleb(-2)
+
+
+def as_money(value) -> Decimal:
+    """Normaliza um valor qualquer para Decimal com 2 casas (0 se None)"""
+    return from_minor(to_minor(value)) if value is not None else Decimal("0.00")
+
+
+class Money(TypeDecorator):
+    """Valor monetário guardado como inteiro em centavos (BIGINT).
+    No Python é Decimal com 2 casas; SUM/comparações no banco são inteiras e exatas."""
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return to_minor(value) if value is not None else None
+
+    def process_result_value(self, value, dialect):
+        return from_minor(value) if value is not None else None
+
+
+
 class User(Base):
     __tablename__ = "users"
     
@@ -26,6 +65,7 @@ class User(Base):
     transactions = relationship("Transaction", back_populates="user", cascade="all, delete-orphan")
     budgets = relationship("Budget", back_populates="user", cascade="all, delete-orphan")
     categories = relationship("Category", back_populates="user", cascade="all, delete-orphan")
+    rollups = relationship("MonthlyRollup", cascade="all, delete-orphan")
     
     # Self-referential relationship for dependents
     parent_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -37,26 +77,85 @@ class Transaction(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     description = Column(String, index=True)
-    amount = Column(Float)
+    amount = Column(Money)
     type = Column(String)  # 'income' or 'expense'
     category = Column(String, index=True)
     date = Column(Date)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # Moeda do valor (ISO 4217). NULL = moeda de quem consulta (linhas anteriores à migração)
+    currency = Column(String(3), nullable=True)
 
     # Feature #17 — Transações Recorrentes
     is_recurring = Column(Boolean, default=False)
     recurrence_day = Column(Integer, nullable=True)  # Dia do mês (1-31)
     recurrence_active = Column(Boolean, default=True)
+    # Ocorrência gerada: id do template recorrente que a originou
+    recurring_template_id = Column(Integer, ForeignKey("transactions.id", ondelete="SET NULL"), nullable=True)
+    # Template: data da próxima ocorrência a gerar (NULL se não recorrente ou inativo)
+    next_due_date = Column(Date, nullable=True)
+
+    # Importação de extratos: hash de (user_id, data, valor, descrição normalizada, ocorrência)
+    # para ignorar linhas já importadas. NULL em transações criadas pela API.
+    import_hash = Column(String, nullable=True)
 
     # Relationship
     user = relationship("User", back_populates="transactions")
 
+    # Índices compostos das consultas analíticas (user_id IN (...) + intervalo de datas)
+    # Bancos existentes: python -m backend.migrate_indexes
+    __table_args__ = (
+        Index("ix_transactions_user_date", "user_id", "date"),
+        Index("ix_transactions_user_category_type_date", "user_id", "category", "type", "date"),
+        Index("ix_transactions_user_import_hash", "user_id", "import_hash", unique=True),
+        Index("ix_transactions_recurring_template_date", "recurring_template_id", "date"),
+        Index("ix_transactions_next_due_date", "next_due_date"),
+    )
+
+class MonthlyRollup(Base):
+    """Totais mensais por (usuário, mês, tipo, categoria, moeda), mantidos nas escritas do crud.
+    Reconstruir a partir das transações: python -m backend.rebuild_rollups"""
+    __tablename__ = "monthly_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    year_month = Column(String, nullable=False)  # "YYYY-MM"
+    type = Column(String)
+    category = Column(String)
+    currency = Column(String(3), nullable=True)
+    total = Column(Money, default=0)
+    count = Column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "year_month", "type", "category", "currency", name="uq_monthly_rollups_key"),
+    )
+
+class FamilyVersion(Base):
+    """Versão dos dados de uma família (id do usuário raiz; 0 = global) para o cache de respostas.
+    Incrementada pelas escritas do crud na mesma transação (backend/response_cache.py)"""
+    __tablename__ = "family_versions"
+
+    family_id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(Integer, nullable=False, default=0)
+
+class ExchangeRate(Base):
+    """Cotação diária: unidades de currency por 1 USD. Carregada com python -m backend.fx"""
+    __tablename__ = "exchange_rates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    currency = Column(String(3), nullable=False)
+    date = Column(Date, nullable=False)
+    rate = Column(Float, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("currency", "date", name="uq_exchange_rates_currency_date"),
+    )
+
 class Budget(Base):
     __tablename__ = "budgets"
 
     id = Column(Integer, primary_key=True, index=True)
     category = Column(String, index=True)  # Removido unique=True para permitir mesma categoria por usuário
-    limit_amount = Column(Float)
+    limit_amount = Column(Money)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     
     # Relationship
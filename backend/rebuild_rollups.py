@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Reconstrói a tabela monthly_rollups a partir das transações existentes.
+Execute após a migração ou se os totais mensais ficarem inconsistentes
+(ex.: transações alteradas direto no banco):
+
+    python -m backend.rebuild_rollups
+"""
+
+from . import models, database, crud
+
+
+def rebuild():
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        print("[rollups] Recalculando totais mensais...")
+        linhas = crud.rebuild_rollups(db)
+        print(f"[rollups] ✅ {linhas} linhas geradas em monthly_rollups")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    rebuild()
@@ -0,0 +1,189 @@
+"""
+Cache das respostas dos endpoints analíticos (/summary, /analytics/categories/,
+/budgets/status/, /transactions/report).
+
+Chave: (endpoint, família, versões da família/global/usuários, usuário, dia, parâmetros).
+As versões ficam na tabela family_versions e são incrementadas pelas escritas
+do crud na mesma transação do banco que muda os dados: a da família com as
+transações/orçamentos dela, a global (GLOBAL_FAMILY) com cotações (fx) e a de
+usuários (USERS_FAMILY) com parent_id/moeda/is_active/role. versions() lê as
+três uma vez por requisição (junto com a autenticação) e a mesma leitura
+valida os caches por processo que compute() consulta (escopo e raiz da
+família no crud, séries de cotações no fx): um acerto de cache não faz
+nenhuma consulta além dessa, e uma leitura que já vê a escrita não monta a
+resposta com dados anteriores a ela, em nenhum worker.
+
+As consultas rodam em AsyncSession.run_sync; o backend é chamado direto do
+event loop (redis.asyncio), fora dele.
+
+Backends (RESPONSE_CACHE_BACKEND):
+- memory (padrão): LRU com TTL por processo
+- redis: compartilhado entre workers (REDIS_URL); sem o pacote redis a
+  primeira requisição falha com RuntimeError (não cai para memory)
+- off: sem cache
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import date
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import database, models
+from .cache import TTLCache
+
+GLOBAL_FAMILY = 0   # cotações (fx)
+USERS_FAMILY = -1   # usuários/famílias: parent_id, role, is_active, moeda, cadastro/exclusão
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.2"))
+
+
+class MemoryBackend:
+    """LRU por processo; guarda o próprio objeto da resposta"""
+    name = "memory"
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str):
+        return self._cache.get(key)
+
+    async def set(self, key: str, value):
+        self._cache.set(key, value)
+
+
+class RedisBackend:
+    """Redis compartilhado; guarda a resposta em JSON com expiração.
+    Falhas do Redis viram miss (a resposta é recalculada), nunca erro."""
+    name = "redis"
+
+    def __init__(self, url: str, ttl: float):
+        import redis.asyncio as aioredis
+        from redis.exceptions import RedisError
+        self._errors = RedisError
+        self._client = aioredis.Redis.from_url(url, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT)
+        self.ttl = max(int(ttl), 1)
+
+    async def get(self, key: str):
+        try:
+            raw = await self._client.get(key)
+        except self._errors:
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value):
+        from fastapi.encoders import jsonable_encoder
+        try:
+            await self._client.set(key, json.dumps(jsonable_encoder(value)), ex=self.ttl)
+        except self._errors:
+            pass
+
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self) -> dict:
+        backend = _get_backend()
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": backend.name if backend else "off",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0,
+            }
+
+
+stats = _Stats()
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _get_backend():
+    """Backend configurado, criado no primeiro uso (None com RESPONSE_CACHE_BACKEND=off)"""
+    global _backend
+    if _backend is None and RESPONSE_CACHE_BACKEND != "off":
+        with _backend_lock:
+            if _backend is None:
+                if RESPONSE_CACHE_BACKEND == "redis":
+                    try:
+                        _backend = RedisBackend(REDIS_URL, RESPONSE_CACHE_TTL)
+                    except ImportError as e:
+                        raise RuntimeError(
+                            "RESPONSE_CACHE_BACKEND=redis requer o pacote redis (pip install -r requirements.txt)"
+                        ) from e
+                else:
+                    _backend = MemoryBackend(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+    return _backend
+
+
+def bump(db: Session, familias):
+    """Incrementa a versão das famílias (IDs raiz, GLOBAL_FAMILY ou USERS_FAMILY), sem commit.
+    Chamado pelas escritas antes do commit que muda os dados."""
+    familias = sorted(set(familias))
+    if not familias:
+        return
+    # O resto da sessão volta a ler as versões (ver versions)
+    db.info.pop("versoes", None)
+    database.upsert_increment(
+        db, models.FamilyVersion.__table__, [{"family_id": f, "version": 1} for f in familias],
+        ["family_id"], ["version"]
+    )
+
+
+def versions(db: Session, familia: int = None) -> dict:
+    """Versões {GLOBAL_FAMILY, USERS_FAMILY[, familia]: versão} da sessão.
+
+    Lidas uma vez por sessão (uma requisição) e guardadas em db.info: auth,
+    escopo familiar do crud e cache de respostas validam seus caches por
+    processo com a mesma leitura, em vez de uma consulta cada. Família ainda
+    não lida na sessão é buscada na hora (só ela).
+    """
+    versoes = db.info.get("versoes") or {}
+    faltando = {GLOBAL_FAMILY, USERS_FAMILY, familia} - versoes.keys() - {None}
+    if faltando:
+        lidas = dict(db.query(models.FamilyVersion.family_id, models.FamilyVersion.version).filter(
+            models.FamilyVersion.family_id.in_(faltando)
+        ).all())
+        versoes = {**versoes, **{f: lidas.get(f, 0) for f in faltando}}
+        db.info["versoes"] = versoes
+    return versoes
+
+
+def _cache_key(db: Session, endpoint: str, familia: int, user_id: int, params) -> str:
+    versoes = versions(db, familia)
+    # Dia incluído: endpoints com período padrão = mês atual mudam na virada do dia/mês
+    bruto = json.dumps([date.today().isoformat(), user_id, params], default=str, sort_keys=True)
+    return "resp:{}:{}:{}:{}:{}:{}".format(
+        endpoint, familia, versoes[familia], versoes[GLOBAL_FAMILY], versoes[USERS_FAMILY],
+        hashlib.sha1(bruto.encode()).hexdigest()
+    )
+
+
+async def cached(db: AsyncSession, endpoint: str, familia: int, user_id: int, params, compute):
+    """Resposta de compute(sessão síncrona) em cache por (endpoint, família/versões, usuário, dia, params).
+    familia é a raiz já resolvida (crud.get_family_root)."""
+    backend = _get_backend()
+    if backend is None:
+        return await db.run_sync(compute)
+    key = await db.run_sync(_cache_key, endpoint, familia, user_id, params)
+    value = await backend.get(key)
+    stats.record(value is not None)
+    if value is None:
+        value = await db.run_sync(compute)
+        await backend.set(key, value)
+    return value
@@ -1,26 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
+import csv
+import io
+import json
 import os
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import timedelta, date
-from sqlalchemy.exc import IntegrityError
-from . import crud, models, schemas, database, auth
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from pydantic import ValidationError
+from . import crud, crud_async, models, schemas, database, auth, importer, fx, response_cache
 
 
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 router = APIRouter()
 
 # --- Rotas de Convite (Dependentes) ---
 
 @router.post("/invite", response_model=schemas.InviteResponse)
-def generate_invite(current_user: models.User = Depends(auth.get_current_user_required)):
+def generate_invite(current_user: auth.CurrentUser = Depends(auth.get_current_user_required)):
     if current_user.role == "subadmin":
         raise HTTPException(status_code=403, detail="Los subadministradores no pueden generar invitaciones.")
     try:
@@ -38,7 +37,7 @@ def generate_invite(current_user: models.User = Depends(auth.get_current_user_re
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/invite/info", response_model=schemas.InviteInfo)
-def get_invite_info(token: str, db: Session = Depends(get_db)):
+def get_invite_info(token: str, db: Session = Depends(database.get_db)):
     from . import invites
     parent_id = invites.verify_invite_token(token)
     if not parent_id:
@@ -57,7 +56,7 @@ def get_invite_info(token: str, db: Session = Depends(get_db)):
     }
 
 @router.post("/register-dependent", response_model=schemas.User)
-def register_dependent(data: schemas.DependentRegister, db: Session = Depends(get_db)):
+def register_dependent(data: schemas.DependentRegister, db: Session = Depends(database.get_db)):
     from . import invites
     parent_id = invites.verify_invite_token(data.token)
     if not parent_id:
@@ -101,8 +100,14 @@ def register_dependent(data: schemas.DependentRegister, db: Session = Depends(ge
 # ============ AUTH ============
 
 @router.post("/auth/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
     """Login y obtener token JWT"""
+    cliente = request.client.host if request.client else ""
+    if not auth.login_limiter.allow((cliente, form_data.username.strip().lower())):
+        raise HTTPException(
+            status_code=429,
+            detail="Demasiados intentos de inicio de sesión. Intenta de nuevo en unos segundos."
+        )
     user = auth.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
@@ -121,7 +126,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 
 
 @router.post("/auth/register", response_model=schemas.User)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+def register(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
     """Registrar nuevo usuario"""
     if crud.get_user_by_username(db, user.username):
         raise HTTPException(
@@ -150,18 +155,21 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/users/me", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(auth.get_current_user_required)):
+async def read_users_me(
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
+):
     """Obtener usuario actual"""
-    return current_user
+    return await crud_async.get_user(db, current_user.id)
 
 
 @router.get("/users/dependents", response_model=List[schemas.UserSimple])
-def read_dependents(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+async def read_dependents(
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
     """Listar dependentes do usuário logado"""
-    return crud.get_dependents(db, current_user.id)
+    return await crud_async.get_dependents(db, current_user.id)
 
 
 # ============ USERS (Admin Only) ============
@@ -170,8 +178,8 @@ def read_dependents(
 def read_users(
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_any_admin)
+    db: Session = Depends(database.get_db),
+    current_user: auth.CurrentUser = Depends(auth.require_any_admin)
 ):
     """Listar todos los usuarios (solo admin/subadmin)"""
     if current_user.role == "subadmin":
@@ -188,8 +196,8 @@ def read_users(
 @router.post("/users/", response_model=schemas.User)
 def create_user(
     user: schemas.UserCreate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_admin)
+    db: Session = Depends(database.get_db),
+    current_user: auth.CurrentUser = Depends(auth.require_admin)
 ):
     """Crear usuario (solo admin)"""
     # Verificar username único
@@ -214,8 +222,8 @@ def create_user(
 @router.get("/users/{user_id}", response_model=schemas.User)
 def read_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_admin)
+    db: Session = Depends(database.get_db),
+    current_user: auth.CurrentUser = Depends(auth.require_admin)
 ):
     """Obtener usuario por ID (solo admin)"""
     db_user = crud.get_user(db, user_id)
@@ -228,8 +236,8 @@ def read_user(
 def update_user(
     user_id: int,
     user_update: schemas.UserUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_admin)
+    db: Session = Depends(database.get_db),
+    current_user: auth.CurrentUser = Depends(auth.require_admin)
 ):
     """Actualizar usuario (solo admin)"""
     db_user = crud.get_user(db, user_id)
@@ -265,8 +273,8 @@ def update_user(
 @router.patch("/users/{user_id}/toggle", response_model=schemas.User)
 def toggle_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_admin)
+    db: Session = Depends(database.get_db),
+    current_user: auth.CurrentUser = Depends(auth.require_admin)
 ):
     """Activar/Inactivar usuario (solo admin)"""
     db_user = crud.toggle_user_status(db, user_id)
@@ -277,8 +285,8 @@ def toggle_user(
 @router.delete("/users/{user_id}")
 def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_admin)
+    db: Session = Depends(database.get_db),
+    current_user: auth.CurrentUser = Depends(auth.require_admin)
 ):
     """Eliminar usuario (solo admin)"""
     # No permitir auto-eliminación
@@ -296,8 +304,8 @@ def delete_user(
 @router.patch("/users/{user_id}/toggle", response_model=schemas.User)
 def toggle_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.require_admin)
+    db: Session = Depends(database.get_db),
+    current_user: auth.CurrentUser = Depends(auth.require_admin)
 ):
     """Activar/Inactivar usuario (solo admin)"""
     # No permitir auto-inactivación
@@ -313,15 +321,147 @@ def toggle_user(
 # ============ TRANSACTIONS ============
 
 @router.post("/transactions/", response_model=schemas.Transaction)
-def create_transaction(
+async def create_transaction(
     transaction: schemas.TransactionCreate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
+):
+    return await crud_async.create_transaction(db, transaction, user_id=current_user.id)
+
+# Importação em lote: linhas por commit e máximo de linhas por requisição
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "50000"))
+
+
+async def _iter_bulk_rows(request: Request):
+    """Itera as linhas do corpo: array JSON ou NDJSON (uma transação por linha, lido em streaming)"""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+        return
+
+    try:
+        rows = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="JSON inválido")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Se esperaba una lista de transacciones")
+    for row in rows:
+        yield row
+
+
+def _parse_bulk_row(row) -> schemas.TransactionCreate:
+    if isinstance(row, bytes):
+        row = json.loads(row)
+    return schemas.TransactionCreate.model_validate(row)
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc']) or 'linha'}: {err['msg']}" for err in e.errors()
+    )
+
+
+@router.post("/transactions/bulk", response_model=schemas.TransactionBulkResponse)
+async def create_transactions_bulk(
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
-    return crud.create_transaction(db=db, transaction=transaction, user_id=current_user.id)
+    """Criar transações em lote.
+
+    Corpo: array JSON de transações ou NDJSON (Content-Type: application/x-ndjson).
+    Cada linha é validada isoladamente; as válidas são gravadas em blocos de
+    BULK_CHUNK_SIZE com um commit por bloco. Retorna o resultado por linha.
+    Acima de BULK_MAX_ROWS a leitura para: truncado=true e um único resultado
+    de erro no índice da primeira linha não processada.
+    """
+    resultados = []
+    pendentes = []  # (indice, TransactionCreate)
+
+    async def gravar():
+        if not pendentes:
+            return
+        try:
+            ids = await crud_async.create_transactions_batch(
+                db, [t for _, t in pendentes], user_id=current_user.id
+            )
+            resultados.extend(schemas.TransactionBulkResult(indice=i, id=id_) for (i, _), id_ in zip(pendentes, ids))
+        except SQLAlchemyError as e:
+            await db.rollback()
+            erro = f"Error al guardar el bloque: {e.__class__.__name__}"
+            resultados.extend(schemas.TransactionBulkResult(indice=i, erro=erro) for i, _ in pendentes)
+        pendentes.clear()
+
+    indice = 0
+    truncado = False
+    async for row in _iter_bulk_rows(request):
+        if indice >= BULK_MAX_ROWS:
+            # Para de ler: um único marcador; o cliente reenvia a partir deste índice
+            truncado = True
+            resultados.append(schemas.TransactionBulkResult(
+                indice=indice,
+                erro=f"Límite de {BULK_MAX_ROWS} filas por solicitud excedido; no se procesaron las filas desde esta"
+            ))
+            break
+        try:
+            pendentes.append((indice, _parse_bulk_row(row)))
+        except ValidationError as e:
+            resultados.append(schemas.TransactionBulkResult(indice=indice, erro=_validation_message(e)))
+        except ValueError:
+            resultados.append(schemas.TransactionBulkResult(indice=indice, erro="JSON inválido"))
+        if len(pendentes) >= BULK_CHUNK_SIZE:
+            await gravar()
+        indice += 1
+    await gravar()
+
+    resultados.sort(key=lambda r: r.indice)
+    criadas = sum(1 for r in resultados if r.id is not None)
+    return schemas.TransactionBulkResponse(
+        total=len(resultados), criadas=criadas, erros=len(resultados) - criadas, resultados=resultados,
+        truncado=truncado
+    )
+
+
+@router.post("/transactions/import", response_model=schemas.TransactionImportResult)
+def import_transactions(
+    arquivo: UploadFile = File(...),
+    formato: Optional[str] = Form(None),
+    encoding: str = Form("utf-8-sig"),
+    db: Session = Depends(database.get_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
+):
+    """Importar extrato bancário (CSV ou OFX) do usuário atual.
+
+    O upload é lido em streaming e gravado em blocos; linhas já importadas
+    (mesma data, valor e descrição) são contadas como duplicadas.
+    """
+    formato = (formato or importer.detect_format(arquivo.filename)).lower()
+    if formato not in importer.PARSERS:
+        raise HTTPException(status_code=400, detail="Formato no soportado (use csv u ofx)")
+    try:
+        stream = io.TextIOWrapper(arquivo.file, encoding=encoding, errors="replace", newline="")
+    except LookupError:
+        raise HTTPException(status_code=400, detail="Codificación desconocida")
+    try:
+        return importer.import_statement(db, stream, formato, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        stream.detach()
+
 
 @router.get("/transactions/", response_model=List[schemas.Transaction])
-def read_transactions(
+async def read_transactions(
+    response: Response,
     skip: int = 0, 
     limit: int = 100,
     # Filtros opcionais
@@ -334,13 +474,19 @@ def read_transactions(
     busca: Optional[str] = None,
     ordenar_por: str = "date",
     ordem: str = "desc",
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
-    """Listar transações com filtros opcionais"""
-    # Se houver filtros, usar busca avançada
+    """Listar transações com filtros opcionais.
+
+    Paginação keyset: envie cursor="" na primeira página e depois o valor do
+    header X-Next-Cursor (ausente na última página).
+    """
+    # Se houver filtros ou cursor, usar busca avançada
     if any([data_inicio, data_fim, tipo, categoria, valor_min is not None, 
-            valor_max is not None, busca, ordenar_por != "date", ordem != "desc"]):
+            valor_max is not None, busca, ordenar_por != "date", ordem != "desc",
+            cursor is not None]):
         filtros = schemas.TransactionFilter(
             data_inicio=data_inicio,
             data_fim=data_fim,
@@ -352,58 +498,155 @@ def read_transactions(
             ordenar_por=ordenar_por,
             ordem=ordem,
             skip=skip,
-            limit=limit
+            limit=limit,
+            cursor=cursor or None
         )
-        transacoes, _ = crud.get_transactions_filtered(db, filtros, user_id=current_user.id)
+        try:
+            transacoes, proximo_cursor = await crud_async.get_transactions_filtered(db, filtros, user_id=current_user.id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if proximo_cursor:
+            response.headers["X-Next-Cursor"] = proximo_cursor
         return transacoes
     else:
         # Busca simples original
-        return crud.get_transactions(db, user_id=current_user.id, skip=skip, limit=limit)
+        return await crud_async.get_transactions(db, user_id=current_user.id, skip=skip, limit=limit)
+
+# Exportação: linhas por bloco enviado ao cliente
+EXPORT_FLUSH_ROWS = 500
+EXPORT_CSV_HEADER = ["ID", "Fecha", "Descripción", "Categoría", "Tipo", "Monto", "Moneda", "Usuario"]
+
+
+def _export_stream(filtros: schemas.TransactionFilter, user_id: int, formato: str):
+    """Gera o arquivo em blocos. Abre a própria sessão: o gerador roda depois
+    que a rota retorna, quando a sessão da dependência já foi fechada."""
+    db = database.SessionLocal()
+    try:
+        buf = io.StringIO()
+        if formato == "csv":
+            writer = csv.writer(buf)
+            buf.write("\ufeff")  # BOM para o Excel reconhecer UTF-8
+            writer.writerow(EXPORT_CSV_HEADER)
+            # Cabeçalho enviado antes da consulta: primeiro byte imediato
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        n = 0
+        for t in crud.iter_transactions_export(db, filtros, user_id):
+            if formato == "csv":
+                writer.writerow([t.id, t.date.isoformat(), t.description, t.category,
+                                 "Ingreso" if t.type == "income" else "Gasto", float(t.amount), t.currency, t.username])
+            else:
+                buf.write(json.dumps({
+                    "id": t.id, "date": t.date.isoformat(), "description": t.description,
+                    "category": t.category, "type": t.type, "amount": float(t.amount),
+                    "currency": t.currency, "user_id": t.user_id, "username": t.username,
+                }, ensure_ascii=False))
+                buf.write("\n")
+            n += 1
+            if n % EXPORT_FLUSH_ROWS == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        if buf.tell():
+            yield buf.getvalue()
+    finally:
+        db.close()
+
+
+@router.get("/transactions/export")
+async def export_transactions(
+    formato: str = "csv",
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    tipo: Optional[str] = None,
+    categoria: Optional[str] = None,
+    valor_min: Optional[float] = None,
+    valor_max: Optional[float] = None,
+    busca: Optional[str] = None,
+    ordenar_por: str = "date",
+    ordem: str = "desc",
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
+):
+    """Exportar todas as transações da família (CSV ou NDJSON) com os filtros de TransactionFilter.
+
+    A resposta é gerada em streaming a partir de um cursor no servidor,
+    sem paginação e sem carregar o resultado inteiro em memória.
+    """
+    if formato not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Formato no soportado (use csv o ndjson)")
+    filtros = schemas.TransactionFilter(
+        data_inicio=data_inicio,
+        data_fim=data_fim,
+        tipo=tipo,
+        categoria=categoria,
+        valor_min=valor_min,
+        valor_max=valor_max,
+        busca=busca,
+        ordenar_por=ordenar_por,
+        ordem=ordem,
+    )
+    media_type = "text/csv; charset=utf-8" if formato == "csv" else "application/x-ndjson"
+    nome = f"movimientos_{date.today().isoformat()}.{formato}"
+    return StreamingResponse(
+        _export_stream(filtros, current_user.id, formato),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{nome}"'},
+    )
+
 
 @router.put("/transactions/{transaction_id}", response_model=schemas.Transaction)
-def update_transaction(
+async def update_transaction(
     transaction_id: int, 
     transaction: schemas.TransactionUpdate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
     if current_user.parent_id and current_user.role == "user":
         raise HTTPException(status_code=403, detail="Los dependientes no pueden editar transacciones")
         
-    db_transaction = crud.update_transaction(db, transaction_id, transaction, user_id=current_user.id)
+    try:
+        db_transaction = await crud_async.update_transaction(db, transaction_id, transaction, user_id=current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if db_transaction is None:
         raise HTTPException(status_code=404, detail="Transacción no encontrada")
     return db_transaction
 
 @router.delete("/transactions/{transaction_id}")
-def delete_transaction(
+async def delete_transaction(
     transaction_id: int, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
     if current_user.parent_id and current_user.role == "user":
         raise HTTPException(status_code=403, detail="Los dependientes no pueden eliminar transacciones")
         
-    crud.delete_transaction(db, transaction_id, user_id=current_user.id)
+    await crud_async.delete_transaction(db, transaction_id, user_id=current_user.id)
     return {"ok": True}
 
 
 # ============ TRANSACTION SEARCH & REPORTS ============
 
 @router.post("/transactions/search", response_model=schemas.TransactionSearchResponse)
-def search_transactions(
+async def search_transactions(
     filtros: schemas.TransactionFilter, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
     """Busca avançada de transações com estatísticas"""
     import math
     
     # Buscar transações filtradas
-    transacoes, total = crud.get_transactions_filtered(db, filtros, user_id=current_user.id)
+    try:
+        transacoes, proximo_cursor = await crud_async.get_transactions_filtered(db, filtros, user_id=current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Calcular estatísticas
-    estatisticas = crud.get_transactions_stats(db, transacoes)
+    # Estatísticas sobre todo o conjunto filtrado (agregadas no banco); o total
+    # sai do mesmo agregado, sem um COUNT separado
+    estatisticas, total_exato = await crud_async.get_search_stats(db, filtros, user_id=current_user.id)
+    total = estatisticas.quantidade_transacoes
     
     # Calcular paginação
     total_paginas = math.ceil(total / filtros.limit) if filtros.limit > 0 else 1
@@ -414,267 +657,229 @@ def search_transactions(
         total=total,
         pagina_atual=pagina_atual,
         total_paginas=total_paginas,
-        estatisticas=estatisticas
+        total_exato=total_exato,
+        estatisticas=estatisticas,
+        proximo_cursor=proximo_cursor
     )
 
 
 @router.get("/transactions/report", response_model=schemas.TransactionReport)
-def get_transactions_report(
+async def get_transactions_report(
     data_inicio: date,
     data_fim: date,
     agrupar_por: str = "month",
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+    moeda: Optional[str] = None,  # Moeda dos totais (padrão: a do usuário)
+    incluir_transacoes: bool = True,  # False: só os agregados
+    limit: Optional[int] = None,  # Paginar as transações (data desc); sem limit vêm todas
+    cursor: Optional[str] = None,  # proximo_cursor da página anterior
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
-    """Gerar relatório de transações com análise temporal"""
-    # Obter transações e evolução temporal
-    transacoes, evolucao_temporal = crud.get_transactions_by_period(
-        db, data_inicio, data_fim, user_id=current_user.id, agrupar_por=agrupar_por
-    )
-    
-    # Calcular estatísticas gerais
-    estatisticas = crud.get_transactions_stats(db, transacoes)
-    
-    # Top categorias de despesas
-    despesas = [t for t in transacoes if t.type == 'expense']
-    categorias_despesas = {}
-    for t in despesas:
-        if t.category not in categorias_despesas:
-            categorias_despesas[t.category] = {'categoria': t.category, 'total': 0, 'quantidade': 0}
-        categorias_despesas[t.category]['total'] += t.amount
-        categorias_despesas[t.category]['quantidade'] += 1
-    
-    top_categorias_despesas = sorted(
-        categorias_despesas.values(), 
-        key=lambda x: x['total'], 
-        reverse=True
-    )[:5]
-    
-    # Top categorias de receitas
-    receitas = [t for t in transacoes if t.type == 'income']
-    categorias_receitas = {}
-    for t in receitas:
-        if t.category not in categorias_receitas:
-            categorias_receitas[t.category] = {'categoria': t.category, 'total': 0, 'quantidade': 0}
-        categorias_receitas[t.category]['total'] += t.amount
-        categorias_receitas[t.category]['quantidade'] += 1
-    
-    top_categorias_receitas = sorted(
-        categorias_receitas.values(), 
-        key=lambda x: x['total'], 
-        reverse=True
-    )[:5]
-    
-    return schemas.TransactionReport(
-        data_inicio=data_inicio,
-        data_fim=data_fim,
-        transacoes=transacoes,
-        estatisticas=estatisticas,
-        evolucao_temporal=evolucao_temporal,
-        top_categorias_despesas=top_categorias_despesas,
-        top_categorias_receitas=top_categorias_receitas
-    )
+    """Gerar relatório de transações com análise temporal.
+    Para todas as linhas do período em streaming, use /transactions/export."""
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit debe ser mayor que cero")
+    try:
+        return await crud_async.get_transactions_report(
+            db, data_inicio, data_fim, user_id=current_user.id, agrupar_por=agrupar_por, moeda=moeda,
+            incluir_transacoes=incluir_transacoes, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        # Cotação ausente (fx.MissingRateError) ou cursor inválido
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 # ============ BUDGETS ============
 
 @router.post("/budgets/", response_model=schemas.Budget)
-def create_budget(
+async def create_budget(
     budget: schemas.BudgetCreate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
     if current_user.parent_id and current_user.role == "user":
         raise HTTPException(status_code=403, detail="Los dependientes no pueden crear presupuestos")
 
-    current_budgets = crud.get_budgets(db, user_id=current_user.id)
+    current_budgets = await crud_async.get_budgets(db, user_id=current_user.id)
     for b in current_budgets:
         if b.category.lower() == budget.category.lower():
             raise HTTPException(status_code=400, detail="La categoría ya tiene un presupuesto. Usa Actualizar.")
-    return crud.create_budget(db=db, budget=budget, user_id=current_user.id)
+    return await crud_async.create_budget(db, budget, user_id=current_user.id)
 
 @router.get("/budgets/", response_model=List[schemas.Budget])
-def read_budgets(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+async def read_budgets(
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
     # Dependentes não gerenciam orçamentos, mas podem ser impedidos de ver ou não.
     # Por enquanto, mantemos o acesso do CRUD (que retornará vazio se não tiver parent_id tratado, 
     # mas o CRUD de budgets usa user_id direto. Dependentes não tem budgets próprios).
-    return crud.get_budgets(db, user_id=current_user.id)
+    return await crud_async.get_budgets(db, user_id=current_user.id)
 
 @router.put("/budgets/{budget_id}", response_model=schemas.Budget)
-def update_budget(
+async def update_budget(
     budget_id: int, 
     budget: schemas.BudgetBase, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
     if current_user.parent_id:
         raise HTTPException(status_code=403, detail="Los dependientes no pueden editar presupuestos")
 
-    db_budget = crud.update_budget(db, budget_id, budget, user_id=current_user.id)
+    db_budget = await crud_async.update_budget(db, budget_id, budget, user_id=current_user.id)
     if db_budget is None:
         raise HTTPException(status_code=404, detail="Presupuesto no encontrado")
     return db_budget
 
 @router.delete("/budgets/{budget_id}")
-def delete_budget(
+async def delete_budget(
     budget_id: int, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
     if current_user.parent_id:
         raise HTTPException(status_code=403, detail="Los dependientes no pueden eliminar presupuestos")
 
-    crud.delete_budget(db, budget_id, user_id=current_user.id)
+    await crud_async.delete_budget(db, budget_id, user_id=current_user.id)
     return {"ok": True}
 
 
 # ============ SUMMARY ============
 
 @router.get("/summary")
-def get_summary(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+async def get_summary(
+    moeda: Optional[str] = None,  # Moeda dos totais (padrão: a do usuário)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
-    transactions = crud.get_transactions(db, user_id=current_user.id, limit=1000)
-    budgets = crud.get_budgets(db, user_id=current_user.id)
-    
-    total_income = sum(t.amount for t in transactions if t.type == 'income')
-    total_expenses = sum(t.amount for t in transactions if t.type == 'expense')
-    balance = total_income - total_expenses
-    
-    income_breakdown = {}
-    for t in transactions:
-        if t.type == 'income':
-            income_breakdown[t.category] = income_breakdown.get(t.category, 0) + t.amount
-
-    budget_status = []
-    for budget in budgets:
-        cat_transactions = [t for t in transactions if t.category.lower() == budget.category.lower()]
-        cat_income = sum(t.amount for t in cat_transactions if t.type == 'income')
-        cat_expense = sum(t.amount for t in cat_transactions if t.type == 'expense')
-        effective_limit = budget.limit_amount + cat_income
-        percentage = (cat_expense / effective_limit) * 100 if effective_limit > 0 else 0
-        
-        budget_status.append({
-            "id": budget.id,
-            "category": budget.category,
-            "limit": effective_limit,
-            "original_limit": budget.limit_amount,
-            "income_boost": cat_income,
-            "spent": cat_expense,
-            "percentage": percentage,
-            "alert": percentage >= 70,
-            "critical": percentage >= 90
-        })
-        
-    return {
-        "balance": balance,
-        "income": total_income,
-        "expenses": total_expenses,
-        "income_breakdown": income_breakdown,
-        "budgets": budget_status
-    }
+    try:
+        return await crud_async.get_summary(db, user_id=current_user.id, moeda=moeda)
+    except fx.MissingRateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 # ============ CATEGORIES ============
 
 @router.get("/categories/", response_model=List[schemas.Category])
-def read_categories(
+async def read_categories(
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
-    return crud.get_categories(db, user_id=current_user.id, skip=skip, limit=limit)
+    return await crud_async.get_categories(db, user_id=current_user.id, skip=skip, limit=limit)
 
 @router.post("/categories/", response_model=schemas.Category)
-def create_category(
+async def create_category(
     category: schemas.CategoryCreate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
     if current_user.parent_id and current_user.role == "user":
         raise HTTPException(status_code=403, detail="Los dependientes no pueden crear categorías")
 
     try:
-        return crud.create_category(db=db, category=category, user_id=current_user.id)
+        return await crud_async.create_category(db, category, user_id=current_user.id)
     except Exception as e:
         raise HTTPException(status_code=400, detail="La categoría probablemente ya existe")
 
 @router.delete("/categories/{category_id}")
-def delete_category(
+async def delete_category(
     category_id: int, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
     if current_user.parent_id and current_user.role == "user":
         raise HTTPException(status_code=403, detail="Los dependientes no pueden eliminar categorías")
 
-    crud.delete_category(db, category_id, user_id=current_user.id)
+    await crud_async.delete_category(db, category_id, user_id=current_user.id)
     return {"ok": True}
 
 
 # ============ FEATURE #17 — TRANSAÇÕES RECORRENTES ============
 
 @router.get("/transactions/recurring/", response_model=List[schemas.Transaction])
-def get_recurring_transactions(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+async def get_recurring_transactions(
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
     """Lista todas as transações recorrentes configuradas"""
-    return crud.get_recurring_transactions(db, user_id=current_user.id)
+    return await crud_async.get_recurring_transactions(db, user_id=current_user.id)
+
+@router.get("/transactions/upcoming", response_model=List[schemas.UpcomingPayment])
+async def read_upcoming_payments(
+    dias: int = 7,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
+):
+    """Pagamentos recorrentes da família que vencem de hoje até hoje + dias (dias=0: só hoje)"""
+    if dias < 0 or dias > 366:
+        raise HTTPException(status_code=400, detail="dias debe estar entre 0 y 366")
+    hoje = date.today()
+    return await crud_async.get_upcoming_recurring(db, current_user.id, hoje, hoje + timedelta(days=dias))
 
 @router.post("/transactions/apply-recurring/")
-def apply_recurring_transactions(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+async def apply_recurring_transactions(
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
     """Aplica transações recorrentes do mês atual. Idempotente — pode chamar várias vezes."""
-    criadas = crud.apply_recurring_transactions(db, user_id=current_user.id)
-    return {"applied": len(criadas), "transactions": [t.id for t in criadas]}
+    criadas = await crud_async.apply_recurring_transactions(db, user_id=current_user.id)
+    return {"applied": len(criadas), "transactions": criadas}
 
 @router.delete("/transactions/recurring/{transaction_id}")
-def deactivate_recurring(
+async def deactivate_recurring(
     transaction_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
     """Desactiva una transacción recurrente"""
-    t = db.query(models.Transaction).filter(
-        models.Transaction.id == transaction_id,
-        models.Transaction.user_id == current_user.id,
-        models.Transaction.is_recurring == True
-    ).first()
-    if not t:
+    if not await crud_async.deactivate_recurring(db, transaction_id, user_id=current_user.id):
         raise HTTPException(status_code=404, detail="Transacción recurrente no encontrada")
-    t.recurrence_active = False
-    db.commit()
     return {"ok": True}
 
 
 # ============ FEATURE #6 — ALERTAS DE ORÇAMENTO ============
 
 @router.get("/budgets/status/", response_model=List[schemas.BudgetStatus])
-def get_budget_status(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+async def get_budget_status(
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
     """Retorna el estado de los presupuestos con % de uso en el mes actual"""
     if current_user.parent_id:
         raise HTTPException(status_code=403, detail="Los dependientes no tienen presupuestos")
-    return crud.get_budget_status(db, user_id=current_user.id)
+    try:
+        return await crud_async.get_budget_status(db, user_id=current_user.id)
+    except fx.MissingRateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 # ============ FEATURE #3 — ANALYTICS POR CATEGORIA ============
 
 @router.get("/analytics/categories/", response_model=schemas.CategoryAnalytics)
-def get_category_analytics(
+async def get_category_analytics(
     period: str = None,  # Formato: "YYYY-MM", ex: "2026-02"
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user_required)
+    moeda: Optional[str] = None,  # Moeda dos totais (padrão: a do usuário)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user_required)
 ):
     """Retorna análise de gastos e receitas por categoria no mês especificado"""
-    return crud.get_category_analytics(db, user_id=current_user.id, period=period)
+    try:
+        return await crud_async.get_category_analytics(db, user_id=current_user.id, period=period, moeda=moeda)
+    except fx.MissingRateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# ============ MÉTRICAS ============
+
+@router.get("/metrics/hashing")
+async def get_hashing_metrics(current_user: auth.CurrentUser = Depends(auth.require_admin)):
+    """Latencia del hashing de contraseñas (pool de procesos)"""
+    return auth.hash_metrics.snapshot()
+
+
+@router.get("/metrics/cache")
+async def get_cache_metrics(current_user: auth.CurrentUser = Depends(auth.require_admin)):
+    """Aciertos del caché de respuestas analíticas (por worker)"""
+    return response_cache.stats.snapshot()
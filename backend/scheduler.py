@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Agendador das transações recorrentes.
+
+Aplica, para todos os usuários, as ocorrências vencidas de templates
+recorrentes (crud.apply_due_recurring), incluindo meses perdidos por
+downtime (até RECURRING_MAX_CATCHUP_MONTHS). Na API roda em uma thread de
+fundo iniciada no lifespan; com vários workers só o que obtém o lock de
+arquivo executa. Também pode rodar via cron:
+
+    python -m backend.scheduler           # uma passada
+    python -m backend.scheduler --loop    # contínuo
+
+Variáveis de ambiente:
+    RECURRING_SCHEDULER           0 desativa a thread na API (padrão: 1)
+    RECURRING_SCHEDULER_INTERVAL  segundos entre passadas (padrão: 3600)
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import date
+
+from dotenv import load_dotenv
+
+load_dotenv()
+from . import crud, database
+from .startup import DATA_DIR, lock_file, unlock_file
+
+SCHEDULER_ENABLED = os.getenv("RECURRING_SCHEDULER", "1").lower() in ("1", "true", "yes")
+SCHEDULER_INTERVAL = int(os.getenv("RECURRING_SCHEDULER_INTERVAL", "3600"))
+LOCK_PATH = os.getenv("SCHEDULER_LOCK_PATH", os.path.join(DATA_DIR, ".scheduler.lock"))
+
+
+def run_once(ate: date = None) -> int:
+    """Uma passada do agendador; retorna quantas transações foram criadas"""
+    db = database.SessionLocal()
+    try:
+        criadas = crud.apply_due_recurring(db, ate or date.today())
+    finally:
+        db.close()
+    if criadas:
+        print(f"[scheduler] {len(criadas)} transações recorrentes aplicadas")
+    return len(criadas)
+
+
+def _loop(stop: threading.Event, interval: int):
+    while not stop.is_set():
+        try:
+            run_once()
+        except Exception as e:
+            print(f"[AVISO] Erro no agendador de recorrentes: {e}")
+        stop.wait(interval)
+
+
+class BackgroundScheduler:
+    """Thread de fundo do agendador, ativa só no processo que obtém o lock"""
+
+    def __init__(self, interval: int = SCHEDULER_INTERVAL, lock_path: str = LOCK_PATH):
+        self.interval = interval
+        self.lock_path = lock_path
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+
+    def start(self) -> bool:
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        f = open(self.lock_path, "a+")
+        if not lock_file(f, blocking=False):
+            # Outro worker já roda o agendador
+            f.close()
+            return False
+        self._lock_file = f
+        self._thread = threading.Thread(target=_loop, args=(self._stop, self.interval),
+                                        name="recurring-scheduler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._lock_file:
+            unlock_file(self._lock_file)
+            self._lock_file.close()
+            self._lock_file = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--loop", action="store_true", help="rodar continuamente a cada RECURRING_SCHEDULER_INTERVAL")
+    args = parser.parse_args()
+    if args.loop:
+        stop = threading.Event()
+        try:
+            _loop(stop, SCHEDULER_INTERVAL)
+        except KeyboardInterrupt:
+            stop.set()
+    else:
+        print(f"✅ {run_once()} transações recorrentes aplicadas.")
+
+if __name__ == "__main__":
+    main()
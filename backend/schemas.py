@@ -8,6 +8,7 @@ class TransactionBase(BaseModel):
     type: str
     category: str
     date: date
+    currency: Optional[str] = None  # ISO 4217; padrão: moeda do usuário
     # Feature #17 — Recorrência
     is_recurring: bool = False
     recurrence_day: Optional[int] = None  # Dia do mês (1-31)
@@ -28,6 +29,7 @@ class TransactionUpdate(BaseModel):
     type: Optional[str] = None
     category: Optional[str] = None
     date: Optional[str] = None
+    currency: Optional[str] = None
     is_recurring: Optional[bool] = None
     recurrence_day: Optional[int] = None
     recurrence_active: Optional[bool] = None
@@ -35,6 +37,7 @@ class TransactionUpdate(BaseModel):
 class Transaction(TransactionBase):
     id: int
     user_id: int
+    next_due_date: Optional[date] = None  # Templates recorrentes: próximo vencimento
     user: Optional[UserSimple] = None  # Para mostrar quem fez a transação (pai/filho)
     class Config:
         from_attributes = True
@@ -48,6 +51,7 @@ class BudgetStatus(BaseModel):
     percentage: float
     alert: bool  # True se >= 80%
     exceeded: bool  # True se >= 100%
+    moedas_sem_cotacao: List[str] = []  # Moedas somadas sem conversão (sem cotação carregada)
 
 
 # Feature #3 — Analytics por Categoria
@@ -63,6 +67,8 @@ class CategoryAnalytics(BaseModel):
     income_by_category: List[CategoryData]
     total_expenses: float
     total_income: float
+    currency: Optional[str] = None  # Moeda dos totais
+    moedas_sem_cotacao: List[str] = []  # Moedas somadas sem conversão (sem cotação carregada)
 
 class BudgetBase(BaseModel):
     category: str
@@ -188,11 +194,13 @@ class TransactionFilter(BaseModel):
     categoria: Optional[str] = None
     valor_min: Optional[float] = None
     valor_max: Optional[float] = None
-    busca: Optional[str] = None  # Busca textual na descrição
-    ordenar_por: str = "date"  # date, amount, category
+    busca: Optional[str] = None  # Busca textual (full-text com prefixo) na descrição/categoria
+    ordenar_por: str = "date"  # date, amount, category, description ou relevance (com busca)
     ordem: str = "desc"  # asc ou desc
     skip: int = 0
     limit: int = 100
+    cursor: Optional[str] = None  # Cursor opaco da página anterior (paginação keyset; ignora skip)
+    contagem: str = "exact"  # exact ou cached (total/estatísticas em cache, podem estar defasados)
 
 
 class TransactionStats(BaseModel):
@@ -214,7 +222,9 @@ class TransactionSearchResponse(BaseModel):
     total: int  # Total de registros encontrados
     pagina_atual: int
     total_paginas: int
+    total_exato: bool = True  # False quando total/total_paginas vêm de cache ou são estimados
     estatisticas: TransactionStats
+    proximo_cursor: Optional[str] = None  # None quando não há mais páginas
 
 
 class PeriodoStats(BaseModel):
@@ -230,8 +240,49 @@ class TransactionReport(BaseModel):
     """Relatório completo de transações"""
     data_inicio: date
     data_fim: date
-    transacoes: List[Transaction]
+    transacoes: List[Transaction] = []  # Vazia com incluir_transacoes=false
     estatisticas: TransactionStats
     evolucao_temporal: List[PeriodoStats]  # Evolução por período
     top_categorias_despesas: List[dict]  # Top categorias de despesas
     top_categorias_receitas: List[dict]  # Top categorias de receitas
+    currency: Optional[str] = None  # Moeda dos totais (transacoes ficam na moeda original)
+    moedas_sem_cotacao: List[str] = []  # Moedas somadas sem conversão (sem cotação carregada)
+    proximo_cursor: Optional[str] = None  # Com limit: cursor da próxima página de transacoes
+
+
+class TransactionBulkResult(BaseModel):
+    """Resultado de uma linha da importação em lote"""
+    indice: int  # Posição da linha na entrada (0-based)
+    id: Optional[int] = None  # ID criado (None se a linha falhou)
+    erro: Optional[str] = None
+
+
+class TransactionBulkResponse(BaseModel):
+    """Resposta de POST /transactions/bulk"""
+    total: int
+    criadas: int
+    erros: int
+    resultados: List[TransactionBulkResult]
+    truncado: bool = False  # True se a entrada passou de BULK_MAX_ROWS (o resto não foi lido)
+
+
+class TransactionImportResult(BaseModel):
+    """Resumo de uma importação de extrato (CSV/OFX)"""
+    lidas: int
+    criadas: int
+    duplicadas: int  # Linhas já importadas antes (mesmo import_hash)
+    erros: int
+    detalhes_erros: List[dict] = []  # [{linha, erro}] (primeiros erros)
+
+
+class UpcomingPayment(BaseModel):
+    """Pagamento recorrente com vencimento próximo"""
+    template_id: Optional[int] = None
+    description: str
+    amount: float
+    type: str
+    category: str
+    due_date: date
+    user_id: int
+    lancada: bool  # True se a ocorrência já foi gerada (transaction_id)
+    transaction_id: Optional[int] = None
@@ -0,0 +1,175 @@
+"""
+Inicialização do banco (tabelas, índice full-text, admin padrão, rollups).
+
+Roda uma vez por processo no lifespan da API, serializada entre workers
+por um lock de arquivo: o primeiro worker cria o que falta e os demais
+só confirmam que já existe. Também pode rodar como passo único antes de
+subir os workers:
+
+    python -m backend.startup
+"""
+import os
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+from . import models, database, auth, fts, crud
+
+DATA_DIR = "data"
+LOCK_PATH = os.getenv("INIT_LOCK_PATH", os.path.join(DATA_DIR, ".init.lock"))
+
+
+def lock_file(f, blocking: bool = True) -> bool:
+    """Lock exclusivo entre processos sobre um arquivo aberto (fcntl no Linux, msvcrt no Windows).
+    Com blocking=False retorna False se outro processo já tem o lock."""
+    try:
+        import fcntl
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            return False
+        return True
+    except ImportError:
+        import msvcrt
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+
+
+def unlock_file(f):
+    try:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    except ImportError:
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def init_lock(path: str = LOCK_PATH):
+    """Serializa a inicialização entre workers"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+") as f:
+        lock_file(f)
+        try:
+            yield
+        finally:
+            unlock_file(f)
+
+
+# Colunas em centavos (Money): BIGINT depois de backend.migrate_money
+MONEY_COLUMNS = (
+    ("transactions", "amount"),
+    ("budgets", "limit_amount"),
+    ("monthly_rollups", "total"),
+)
+
+
+def check_money_columns():
+    """Falha se alguma coluna de valor ainda não é inteira (migração para centavos pendente).
+
+    Money lê os inteiros como centavos: subir sobre REAL em reais dividiria todos os valores por 100.
+    """
+    from sqlalchemy import inspect
+    inspector = inspect(database.engine)
+    pendentes = []
+    for tabela, coluna in MONEY_COLUMNS:
+        tipos = {c["name"]: str(c["type"]).upper() for c in inspector.get_columns(tabela)}
+        if coluna in tipos and "INT" not in tipos[coluna]:
+            pendentes.append(f"{tabela}.{coluna} ({tipos[coluna]})")
+    if pendentes:
+        raise RuntimeError(
+            "Colunas de valor ainda não estão em centavos: " + ", ".join(pendentes)
+            + ". Execute python -m backend.migrate_money antes de subir a API."
+        )
+
+
+# Colunas e índices que create_all não acrescenta a tabelas já existentes:
+# (tabela, nome, script que cria), na ordem em que os scripts devem rodar
+MIGRATED_COLUMNS = (
+    ("transactions", "recurring_template_id", "backend.migrate_recurring_links"),
+    ("transactions", "next_due_date", "backend.migrate_next_due_date"),
+    ("transactions", "import_hash", "backend.migrate_import_hash"),
+    ("transactions", "currency", "backend.migrate_currency"),
+    ("monthly_rollups", "currency", "backend.migrate_currency"),
+)
+MIGRATED_INDEXES = (
+    ("transactions", "ix_transactions_recurring_template_date", "backend.migrate_recurring_links"),
+    ("transactions", "ix_transactions_next_due_date", "backend.migrate_next_due_date"),
+    ("transactions", "ix_transactions_user_import_hash", "backend.migrate_import_hash"),
+)
+
+
+def check_migrations(engine=None):
+    """Falha se faltar coluna ou índice de uma migração, nomeando os scripts pendentes.
+
+    Sem a coluna a API subiria e responderia 500 nas consultas que a usam.
+    """
+    from sqlalchemy import inspect
+    inspector = inspect(engine or database.engine)
+    colunas, indices = {}, {}
+    pendentes = {}  # script -> itens faltando
+    for tabela, coluna, script in MIGRATED_COLUMNS:
+        if tabela not in colunas:
+            colunas[tabela] = {c["name"] for c in inspector.get_columns(tabela)}
+        if coluna not in colunas[tabela]:
+            pendentes.setdefault(script, []).append(f"{tabela}.{coluna}")
+    for tabela, indice, script in MIGRATED_INDEXES:
+        if tabela not in indices:
+            indices[tabela] = {i["name"] for i in inspector.get_indexes(tabela)}
+        if indice not in indices[tabela]:
+            pendentes.setdefault(script, []).append(f"índice {indice}")
+    if pendentes:
+        raise RuntimeError(
+            "Esquema do banco desatualizado: "
+            + "; ".join(f"{', '.join(itens)} (python -m {script})" for script, itens in pendentes.items())
+            + ". Execute as migrações antes de subir a API."
+        )
+
+
+def init_database():
+    """Cria tabelas, índice full-text, admin padrão e rollups (idempotente)"""
+    # Create tables
+    models.Base.metadata.create_all(bind=database.engine)
+    check_money_columns()
+    check_migrations()
+
+    # Full-text index for transaction search (SQLite FTS5)
+    fts.ensure_fts_index(database.engine)
+
+    # Create default admin user
+    db = database.SessionLocal()
+    try:
+        auth.create_default_admin(db)
+    except Exception as e:
+        print(f"[AVISO] Error creating admin user: {e}")
+    finally:
+        db.close()
+
+    # Populate monthly rollups on the first start after the table is created
+    db = database.SessionLocal()
+    try:
+        crud.ensure_rollups(db)
+    except Exception as e:
+        print(f"[AVISO] Error building monthly rollups: {e}")
+    finally:
+        db.close()
+
+
+def run_startup():
+    """Inicialização serializada entre workers"""
+    # Ensure data directory exists
+    os.makedirs(DATA_DIR, exist_ok=True)
+    with init_lock():
+        init_database()
+
+
+if __name__ == "__main__":
+    run_startup()
+    print("✅ Banco inicializado.")
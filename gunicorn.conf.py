@@ -0,0 +1,33 @@
+"""
+Configuração do Gunicorn (modo multi-worker da API).
+
+    gunicorn -c gunicorn.conf.py backend.main:app
+
+Variáveis de ambiente:
+    WEB_CONCURRENCY   número de workers (padrão: núcleos de CPU)
+    BIND              endereço (padrão: 0.0.0.0:8000)
+    GUNICORN_PRELOAD  1 = importa o app no master antes do fork (padrão: 1)
+    GUNICORN_TIMEOUT  timeout por requisição em segundos (padrão: 60)
+
+A inicialização do banco roda no lifespan de cada worker, serializada por
+lock de arquivo (backend/startup.py), então os workers não disputam a
+criação de tabelas nem do admin padrão.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or multiprocessing.cpu_count()
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").lower() in ("1", "true", "yes")
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Com preload o master já importou o app: cada worker abre suas próprias conexões
+    from backend import database
+    database.dispose_engines()
@@ -0,0 +1,62 @@
+"""
+Fixtures da suíte: banco SQLite temporário (um por sessão de testes) e um
+usuário novo por teste, para que os dados de um teste não afetem o outro.
+
+    python -m pytest
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+# Antes de importar o backend: database.py lê DATABASE_URL no import
+_tmp = tempfile.mkdtemp(prefix="agente-financeiro-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["RECURRING_SCHEDULER"] = "0"
+os.environ["SKIP_STARTUP_INIT"] = "1"  # o schema é criado pela fixture abaixo
+os.environ["HASH_POOL_SIZE"] = "0"
+os.environ["RESPONSE_CACHE_BACKEND"] = "memory"
+os.environ["ADMIN_DEFAULT_PASSWORD"] = "admin-tests"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from backend import database, models, startup
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    startup.init_database()
+    yield
+    database.dispose_engines()
+
+
+@pytest.fixture
+def db():
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    with TestClient(app) as c:
+        yield c
+
+
+def auth_headers(user) -> dict:
+    from backend import auth
+    return {"Authorization": "Bearer " + auth.create_access_token({"sub": user.username})}
+
+
+@pytest.fixture
+def user(db):
+    u = models.User(username=f"u-{uuid.uuid4().hex[:12]}", password_hash="x", role="user",
+                    is_active=True, currency="COP")
+    db.add(u)
+    db.commit()
+    return u
@@ -0,0 +1,27 @@
+from backend import auth
+
+
+def test_login_limit_is_per_key():
+    limiter = auth.LoginRateLimiter(max_attempts=2, window=60)
+    assert limiter.allow(("1.1.1.1", "ana")) and limiter.allow(("1.1.1.1", "ana"))
+    assert not limiter.allow(("1.1.1.1", "ana"))
+    # Outras contas e outros clientes continuam entrando
+    assert limiter.allow(("1.1.1.1", "bruno"))
+    assert limiter.allow(("2.2.2.2", "ana"))
+
+
+def test_login_window_slides():
+    limiter = auth.LoginRateLimiter(max_attempts=1, window=0.05)
+    assert limiter.allow("k") and not limiter.allow("k")
+    import time
+    time.sleep(0.06)
+    assert limiter.allow("k")
+
+
+def test_login_route_limits_one_account(client, db, user, monkeypatch):
+    user.password_hash = auth.get_password_hash("certa")
+    db.commit()
+    monkeypatch.setattr(auth, "login_limiter", auth.LoginRateLimiter(max_attempts=2, window=60))
+    tentativa = lambda nome: client.post("/auth/login", data={"username": nome, "password": "errada"}).status_code
+    assert [tentativa(user.username) for _ in range(3)] == [401, 401, 429]
+    assert tentativa("outra-conta") == 401
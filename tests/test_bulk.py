@@ -0,0 +1,30 @@
+import json
+
+from backend import routes
+from conftest import auth_headers
+
+
+def _rows(n):
+    return [{"description": f"b{i}", "amount": 1, "type": "expense", "category": "C", "date": "2025-04-01"}
+            for i in range(n)]
+
+
+def test_rows_past_the_limit_are_not_read(client, user, monkeypatch):
+    monkeypatch.setattr(routes, "BULK_MAX_ROWS", 3)
+    H = auth_headers(user)
+    for kwargs in (
+        {"json": _rows(10)},
+        {"content": "\n".join(json.dumps(r) for r in _rows(10)),
+         "headers": {"Content-Type": "application/x-ndjson"}},
+    ):
+        r = client.post("/transactions/bulk", **{**kwargs, "headers": {**H, **kwargs.get("headers", {})}})
+        assert r.status_code == 200, r.text
+        corpo = r.json()
+        assert corpo["truncado"] is True
+        assert (corpo["criadas"], corpo["erros"]) == (3, 1)
+        assert corpo["resultados"][-1]["indice"] == 3 and corpo["resultados"][-1]["erro"]
+
+
+def test_within_the_limit_is_not_truncated(client, user):
+    r = client.post("/transactions/bulk", headers=auth_headers(user), json=_rows(2))
+    assert r.json()["truncado"] is False and r.json()["criadas"] == 2
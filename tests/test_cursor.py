@@ -0,0 +1,58 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from backend import crud, models, schemas
+
+
+@pytest.mark.parametrize("ordenar_por, valor", [
+    ("date", date(2025, 1, 31)),
+    ("amount", Decimal("12.30")),
+    ("description", "Mercado"),
+    ("category", None),
+])
+def test_cursor_round_trip(ordenar_por, valor):
+    filtros = schemas.TransactionFilter(ordenar_por=ordenar_por, ordem="asc")
+    t = models.Transaction(id=42, date=date(2025, 1, 31), amount=Decimal("12.30"),
+                           description="Mercado", category=None)
+    cursor = crud.encode_cursor(filtros, t)
+    decoded, last_id = crud.decode_cursor(filtros, cursor)
+    assert last_id == 42
+    assert decoded == (str(valor) if isinstance(valor, Decimal) else valor)
+
+
+def test_cursor_rejects_other_order_and_garbage():
+    t = models.Transaction(id=1, date=date(2025, 1, 1))
+    cursor = crud.encode_cursor(schemas.TransactionFilter(ordenar_por="date", ordem="asc"), t)
+    with pytest.raises(ValueError):
+        crud.decode_cursor(schemas.TransactionFilter(ordenar_por="date", ordem="desc"), cursor)
+    with pytest.raises(ValueError):
+        crud.decode_cursor(schemas.TransactionFilter(), "não-é-um-cursor")
+
+
+def _pages(db, user_id, **kw):
+    ids, cursor = [], None
+    while True:
+        rows, cursor = crud.get_transactions_filtered(
+            db, schemas.TransactionFilter(cursor=cursor, limit=4, **kw), user_id)
+        ids += [t.id for t in rows]
+        if not cursor:
+            return ids
+
+
+@pytest.mark.parametrize("ordenar_por", ["date", "amount", "category", "description"])
+@pytest.mark.parametrize("ordem", ["asc", "desc"])
+def test_cursor_pages_match_offset_order(db, user, ordenar_por, ordem):
+    # Valores repetidos (desempate por id) e NULL em descrição/categoria
+    for i in range(17):
+        db.add(models.Transaction(
+            user_id=user.id, type="expense", currency="COP", amount=i % 5, date=date(2025, 1, 1 + i % 4),
+            description=None if i % 3 == 0 else f"d{i % 4}", category=None if i % 2 else f"c{i % 3}",
+        ))
+    db.commit()
+    todas, _ = crud.get_transactions_filtered(
+        db, schemas.TransactionFilter(limit=100, ordenar_por=ordenar_por, ordem=ordem), user.id)
+    paginas = _pages(db, user.id, ordenar_por=ordenar_por, ordem=ordem)
+    assert paginas == [t.id for t in todas]
+    assert len(set(paginas)) == 17
@@ -0,0 +1,96 @@
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from backend import crud, database, models, response_cache, schemas
+
+
+def _novo(db, parent_id=None, role="user"):
+    u = crud.create_user(db, schemas.UserCreate(
+        username=f"f-{uuid.uuid4().hex[:12]}", password="x", role=role, parent_id=parent_id), "x")
+    return u.id
+
+
+@pytest.fixture
+def familia(db, user):
+    """Pai (user), um subadmin e dois dependentes comuns"""
+    sub = _novo(db, user.id, role="subadmin")
+    dep1 = _novo(db, user.id)
+    dep2 = _novo(db, user.id)
+    return user.id, sub, dep1, dep2
+
+
+def test_scope_by_role(db, familia):
+    pai, sub, dep1, dep2 = familia
+    assert crud.get_family_user_ids(db, pai) == {pai, sub, dep1, dep2}
+    assert crud.get_family_user_ids(db, sub) == {pai, sub, dep1, dep2}
+    assert crud.get_family_user_ids(db, dep1) == {dep1}
+    for uid in familia:
+        assert crud.get_family_root(db, uid) == pai
+
+
+def test_unknown_user_sees_only_itself(db):
+    assert crud.get_family_user_ids(db, 10 ** 9) == {10 ** 9}
+
+
+def test_adding_dependent_refreshes_scope(db, familia):
+    pai, sub, dep1, dep2 = familia
+    assert crud.get_family_user_ids(db, sub) == {pai, sub, dep1, dep2}
+    novo = _novo(db, pai)
+    assert crud.get_family_user_ids(db, pai) == {pai, sub, dep1, dep2, novo}
+    assert crud.get_family_user_ids(db, sub) == {pai, sub, dep1, dep2, novo}
+    assert crud.get_family_root(db, novo) == pai
+
+
+def test_role_change_and_toggle_bump_users_version(db, familia):
+    pai, sub, dep1, _ = familia
+    assert crud.get_family_user_ids(db, dep1) == {dep1}
+    antes = response_cache.versions(db)[response_cache.USERS_FAMILY]
+
+    crud.update_user(db, dep1, schemas.UserUpdate(role="subadmin"))
+    assert crud.get_family_user_ids(db, dep1) == crud.get_family_user_ids(db, pai)
+
+    crud.toggle_user_status(db, dep1)
+    assert response_cache.versions(db)[response_cache.USERS_FAMILY] == antes + 2
+
+    # Perfil/senha não mudam escopo: sem bump
+    crud.update_user(db, dep1, schemas.UserUpdate(full_name="Outro Nome"), password_hash="y")
+    assert response_cache.versions(db)[response_cache.USERS_FAMILY] == antes + 2
+
+
+def test_change_from_another_worker_is_seen_on_next_request(db, familia):
+    pai, sub, dep1, dep2 = familia
+    assert crud.get_family_user_ids(db, pai) == {pai, sub, dep1, dep2}
+
+    # "Outro worker": grava direto no banco e incrementa a versão, sem limpar os caches deste processo
+    outro = database.SessionLocal()
+    outro.execute(text("UPDATE users SET parent_id = NULL WHERE id = :id"), {"id": dep2})
+    response_cache.bump(outro, [response_cache.USERS_FAMILY])
+    outro.commit()
+    outro.close()
+
+    proxima = database.SessionLocal()  # nova requisição: lê a versão uma vez
+    try:
+        assert crud.get_family_user_ids(proxima, pai) == {pai, sub, dep1}
+        assert crud.get_family_root(proxima, dep2) == dep2
+    finally:
+        proxima.close()
+
+
+def test_cached_scope_costs_no_query(db, familia):
+    from sqlalchemy import event
+
+    pai = familia[0]
+    crud.get_family_user_ids(db, pai)
+    crud.get_family_root(db, pai)
+    consultas = []
+    ouvinte = lambda *a, **k: consultas.append(1)
+    event.listen(database.engine, "before_cursor_execute", ouvinte)
+    try:
+        for _ in range(3):
+            crud.get_family_user_ids(db, pai)
+            crud.get_family_root(db, pai)
+    finally:
+        event.remove(database.engine, "before_cursor_execute", ouvinte)
+    assert consultas == []
@@ -0,0 +1,45 @@
+from datetime import date
+
+from backend import fx
+from conftest import auth_headers
+
+import pytest
+
+
+def _tx(client, headers, amount, currency):
+    r = client.post("/transactions/", headers=headers, json={
+        "description": "x", "amount": amount, "type": "expense", "category": "Comida",
+        "date": date.today().isoformat(), "currency": currency})
+    assert r.status_code == 200, r.text
+
+
+def test_convert_totals_without_rate(db):
+    linhas = [("XTS", date(2025, 1, 10), 7)]
+    with pytest.raises(fx.MissingRateError):
+        fx.convert_totals(db, linhas, "USD")
+    sem_cotacao = set()
+    assert fx.convert_totals(db, linhas, "USD", sem_cotacao) == [7]
+    assert sem_cotacao == {"XTS"}
+
+
+def test_row_without_rate_does_not_break_aggregates(client, db, user):
+    # USD é o pivô (taxa 1), então só XTS fica sem cotação
+    user.currency = "USD"
+    db.commit()
+    H = auth_headers(user)
+    assert client.post("/budgets/", headers=H, json={"category": "Comida", "limit_amount": 100}).status_code == 200
+    _tx(client, H, 10, "USD")
+    _tx(client, H, 5, "XTS")
+
+    hoje = date.today().isoformat()
+    for url in ("/summary", "/budgets/status/", "/analytics/categories/",
+                f"/transactions/report?data_inicio={hoje}&data_fim={hoje}",
+                f"/transactions/report?data_inicio={hoje}&data_fim={hoje}&agrupar_por=day"):
+        r = client.get(url, headers=H)
+        assert r.status_code == 200, (url, r.text)
+        corpo = r.json()
+        item = corpo[0] if isinstance(corpo, list) else corpo
+        assert item["moedas_sem_cotacao"] == ["XTS"], url
+
+    assert client.get("/summary", headers=H).json()["expenses"] == 15
+    assert client.get("/budgets/status/", headers=H).json()[0]["spent"] == 15
@@ -0,0 +1,77 @@
+import io
+
+from backend import crud, importer, models
+
+EXTRATO = (
+    "date,description,amount\n"
+    "2025-01-02,Mercado Exito,-50.00\n"
+    "2025-01-02,Mercado Exito,-50.00\n"  # lançamento idêntico legítimo
+    "2025-01-03,Nomina,2000.00\n"
+    "2025-01-04,Uber,-12.30\n"
+)
+
+
+def _import(db, user_id, texto, **kw):
+    return importer.import_statement(db, io.StringIO(texto), "csv", user_id, **kw)
+
+
+def _count(db, user_id):
+    return db.query(models.Transaction).filter_by(user_id=user_id).count()
+
+
+def test_reimport_creates_nothing(db, user):
+    primeiro = _import(db, user.id, EXTRATO, chunk_size=2)
+    assert (primeiro["criadas"], primeiro["duplicadas"]) == (4, 0)
+    segundo = _import(db, user.id, EXTRATO, chunk_size=3)
+    assert (segundo["criadas"], segundo["duplicadas"]) == (0, 4)
+    assert _count(db, user.id) == 4
+
+
+def test_overlapping_statement_adds_only_new_rows(db, user):
+    _import(db, user.id, EXTRATO)
+    seguinte = EXTRATO + "2025-01-05,Arriendo,-900.00\n"
+    resumo = _import(db, user.id, seguinte)
+    assert (resumo["criadas"], resumo["duplicadas"]) == (1, 4)
+    assert _count(db, user.id) == 5
+
+
+def test_concurrent_import_counts_conflicts_as_duplicates(db, user, monkeypatch):
+    _import(db, user.id, EXTRATO)
+    original = crud.get_existing_import_hashes
+    chamadas = []
+
+    def consulta_defasada(db, user_id, hashes):
+        # A primeira consulta não vê a outra importação (gravada depois dela)
+        chamadas.append(1)
+        return set() if len(chamadas) == 1 else original(db, user_id, hashes)
+
+    monkeypatch.setattr(crud, "get_existing_import_hashes", consulta_defasada)
+    resumo = _import(db, user.id, EXTRATO)
+    assert (resumo["criadas"], resumo["duplicadas"]) == (0, 4)
+    assert _count(db, user.id) == 4
+
+
+def test_same_entry_on_different_days_is_not_a_duplicate(db, user):
+    # Extrato em ordem decrescente: o contador de ocorrências recomeça a cada dia
+    texto = (
+        "date,description,amount\n"
+        "2025-02-03,Cafe,-5.00\n"
+        "2025-02-03,Cafe,-5.00\n"
+        "2025-02-02,Cafe,-5.00\n"
+    )
+    assert _import(db, user.id, texto)["criadas"] == 3
+    assert _import(db, user.id, texto)["duplicadas"] == 3
+
+
+def test_non_finite_amounts_are_errors(db, user):
+    texto = (
+        "date,description,amount\n"
+        "2025-03-01,A,NaN\n"
+        "2025-03-01,B,Infinity\n"
+        "2025-03-01,C,-inf\n"
+        "2025-03-01,D,1e400\n"
+        "2025-03-01,E,-10.00\n"
+    )
+    resumo = _import(db, user.id, texto)
+    assert (resumo["criadas"], resumo["erros"]) == (1, 4)
+    assert [e["linha"] for e in resumo["detalhes_erros"]] == [1, 2, 3, 4]
@@ -0,0 +1,42 @@
+from decimal import Decimal
+
+import pytest
+
+from backend import crud, models, schemas
+
+
+def test_to_minor_rounds_half_cent_up():
+    assert models.to_minor(0.005) == 1
+    assert models.to_minor("10.015") == 1002
+    assert models.to_minor(Decimal("2.675")) == 268
+    assert models.to_minor(2.675) == 268  # o float 2.675 fica abaixo de 2.675; via str não perde o meio centavo
+    assert models.to_minor(-0.005) == -1  # meio centavo se afasta do zero
+
+
+def test_to_minor_rejects_non_finite():
+    for valor in (float("nan"), float("inf"), "-Infinity", Decimal("NaN")):
+        with pytest.raises(ValueError):
+            models.to_minor(valor)
+
+
+def test_as_money_normalizes_to_two_places():
+    assert models.as_money(0.1 + 0.2) == Decimal("0.30")
+    assert models.as_money(None) == Decimal("0.00")
+    assert str(models.as_money(7)) == "7.00"
+    assert models.from_minor(models.to_minor("123.45")) == Decimal("123.45")
+
+
+def test_money_column_round_trip(db, user):
+    t = crud.create_transaction(db, schemas.TransactionCreate(
+        description="x", amount=19.999, type="expense", category="C", date="2025-03-10"), user.id)
+    db.expire_all()
+    assert db.get(models.Transaction, t.id).amount == Decimal("20.00")
+
+
+def test_sum_of_cents_is_exact(db, user):
+    for _ in range(10):
+        crud.create_transaction(db, schemas.TransactionCreate(
+            description="x", amount=0.1, type="expense", category="C", date="2025-03-10"), user.id)
+    rollup = db.query(models.MonthlyRollup).filter_by(user_id=user.id, year_month="2025-03").one()
+    assert rollup.total == Decimal("1.00")
+    assert rollup.count == 10
@@ -0,0 +1,65 @@
+from datetime import date
+
+from backend import crud, models
+
+
+def _template(db, user_id, dia_template, recurrence_day, hoje):
+    t = models.Transaction(
+        user_id=user_id, description="Arriendo", amount=900, type="expense", category="Vivienda",
+        currency="COP", date=dia_template, is_recurring=True, recurrence_day=recurrence_day,
+        recurrence_active=True,
+    )
+    t.next_due_date = crud.template_next_due_date(t, hoje=hoje)
+    db.add(t)
+    db.commit()
+    return t
+
+
+def _occurrences(db, template_id):
+    T = models.Transaction
+    return [r.date for r in db.query(T).filter(T.recurring_template_id == template_id).order_by(T.date)]
+
+
+def test_month_end_clamping():
+    assert crud.recurrence_due_date(date(2025, 2, 1), 31) == date(2025, 2, 28)
+    assert crud.recurrence_due_date(date(2024, 2, 1), 31) == date(2024, 2, 29)
+    assert crud.recurrence_due_date(date(2025, 4, 1), 31) == date(2025, 4, 30)
+    assert crud.recurrence_due_date(date(2025, 1, 1), 31) == date(2025, 1, 31)
+
+
+def test_apply_is_idempotent_and_clamps_month_end(db, user):
+    tpl = _template(db, user.id, date(2025, 1, 31), 31, hoje=date(2025, 1, 31))
+    assert tpl.next_due_date == date(2025, 2, 28)
+
+    criadas = crud.apply_due_recurring(db, date(2025, 4, 30), user_id=user.id)
+    assert len(criadas) == 3
+    assert _occurrences(db, tpl.id) == [date(2025, 2, 28), date(2025, 3, 31), date(2025, 4, 30)]
+
+    # Mesma data de corte (ou anterior): nada novo
+    assert crud.apply_due_recurring(db, date(2025, 4, 30), user_id=user.id) == []
+    assert crud.apply_due_recurring(db, date(2025, 3, 15), user_id=user.id) == []
+    db.refresh(tpl)
+    assert tpl.next_due_date == date(2025, 5, 31)
+
+    # Leap year: fevereiro de 2028 vence no dia 29
+    crud.apply_due_recurring(db, date(2028, 2, 29), user_id=user.id)
+    assert _occurrences(db, tpl.id)[-1] == date(2028, 2, 29)
+    assert len(_occurrences(db, tpl.id)) == len(set(_occurrences(db, tpl.id)))
+
+
+def test_never_applied_template_starts_at_current_month(db, user):
+    # Template de janeiro cadastrado em outubro: não gera fevereiro a setembro
+    tpl = _template(db, user.id, date(2025, 1, 10), 31, hoje=date(2025, 10, 20))
+    assert tpl.next_due_date == date(2025, 10, 31)
+    assert len(crud.apply_due_recurring(db, date(2025, 10, 31), user_id=user.id)) == 1
+    assert _occurrences(db, tpl.id) == [date(2025, 10, 31)]
+
+
+def test_catch_up_continues_after_last_occurrence(db, user):
+    tpl = _template(db, user.id, date(2025, 1, 15), 15, hoje=date(2025, 1, 15))
+    crud.apply_due_recurring(db, date(2025, 2, 28), user_id=user.id)
+    # Agendador parado de março a maio: recupera os meses depois da última ocorrência
+    crud.apply_due_recurring(db, date(2025, 5, 31), user_id=user.id)
+    assert _occurrences(db, tpl.id) == [date(2025, 2, 15), date(2025, 3, 15), date(2025, 4, 15), date(2025, 5, 15)]
+    db.refresh(tpl)
+    assert crud.template_next_due_date(tpl, max(_occurrences(db, tpl.id))) == tpl.next_due_date
@@ -0,0 +1,55 @@
+from sqlalchemy import event, text
+
+from backend import database, response_cache
+from conftest import auth_headers
+
+
+def _queries(client, url, headers):
+    consultas = []
+    ouvinte = lambda conn, cursor, statement, *a: consultas.append(statement)
+    engine = database.get_async_engine().sync_engine
+    event.listen(engine, "before_cursor_execute", ouvinte)
+    try:
+        resposta = client.get(url, headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", ouvinte)
+    assert resposta.status_code == 200, resposta.text
+    return resposta.json(), consultas
+
+
+def _tx(client, headers, amount):
+    r = client.post("/transactions/", headers=headers, json={
+        "description": "x", "amount": amount, "type": "expense", "category": "Comida", "date": "2025-01-10"})
+    assert r.status_code == 200, r.text
+
+
+def test_hit_reads_only_the_versions(client, user):
+    H = auth_headers(user)
+    _tx(client, H, 10)
+    for url in ("/summary", "/analytics/categories/", "/budgets/status/"):
+        primeira, _ = _queries(client, url, H)
+        segunda, consultas = _queries(client, url, H)
+        assert segunda == primeira
+        assert len(consultas) == 1 and "family_versions" in consultas[0], consultas
+
+
+def test_write_invalidates(client, user):
+    H = auth_headers(user)
+    _tx(client, H, 10)
+    antes, _ = _queries(client, "/summary", H)
+    _tx(client, H, 5)
+    depois, _ = _queries(client, "/summary", H)
+    assert depois["expenses"] == antes["expenses"] + 5
+
+
+def test_change_from_another_worker_invalidates(client, db, user):
+    H = auth_headers(user)
+    _tx(client, H, 10)
+    antes, _ = _queries(client, "/summary", H)
+    # "Outro worker": muda os dados e a versão da família sem passar por este processo
+    db.execute(text("UPDATE transactions SET amount = amount * 2 WHERE user_id = :u"), {"u": user.id})
+    db.execute(text("UPDATE monthly_rollups SET total = total * 2 WHERE user_id = :u"), {"u": user.id})
+    response_cache.bump(db, [user.id])
+    db.commit()
+    depois, _ = _queries(client, "/summary", H)
+    assert depois["expenses"] == antes["expenses"] * 2
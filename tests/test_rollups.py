@@ -0,0 +1,68 @@
+from datetime import date
+
+from sqlalchemy import func
+
+from backend import crud, models, schemas
+from conftest import auth_headers
+
+
+def _raw_totals(db, user_id):
+    T = models.Transaction
+    mes = func.strftime("%Y-%m", T.date)
+    rows = db.query(mes, T.type, T.category, T.currency, func.sum(T.amount), func.count(T.id)).filter(
+        T.user_id == user_id
+    ).group_by(mes, T.type, T.category, T.currency).all()
+    return {(m, tp, c, moeda): (models.as_money(total), n) for m, tp, c, moeda, total, n in rows}
+
+
+def _rollups(db, user_id):
+    R = models.MonthlyRollup
+    return {
+        (r.year_month, r.type, r.category, r.currency): (r.total, r.count)
+        for r in db.query(R).filter(R.user_id == user_id)
+    }
+
+
+def _tx(db, user_id, amount, dia, category="Comida", type_="expense", **kw):
+    return crud.create_transaction(db, schemas.TransactionCreate(
+        description="x", amount=amount, type=type_, category=category, date=dia, **kw), user_id)
+
+
+def test_rollups_follow_create_update_delete(db, user):
+    a = _tx(db, user.id, 10.25, date(2025, 1, 5))
+    b = _tx(db, user.id, 4.75, date(2025, 1, 20))
+    c = _tx(db, user.id, 100, date(2025, 2, 1), category="Salario", type_="income")
+    _tx(db, user.id, 3, date(2025, 2, 3), currency="USD")
+    assert _rollups(db, user.id) == _raw_totals(db, user.id)
+
+    # Muda valor, mês, categoria e tipo: sai de uma chave e entra em outra
+    crud.update_transaction(db, a.id, schemas.TransactionUpdate(amount=11.5), user.id)
+    crud.update_transaction(db, b.id, schemas.TransactionUpdate(date="2025-03-02", category="Casa"), user.id)
+    crud.update_transaction(db, c.id, schemas.TransactionUpdate(type="expense"), user.id)
+    assert _rollups(db, user.id) == _raw_totals(db, user.id)
+
+    crud.delete_transaction(db, a.id, user.id)
+    crud.delete_transaction(db, b.id, user.id)
+    assert _rollups(db, user.id) == _raw_totals(db, user.id)
+    # Chaves que ficaram sem transações saem da tabela
+    assert ("2025-01", "expense", "Comida", "COP") not in _rollups(db, user.id)
+
+
+def test_rollups_follow_batch_insert(db, user):
+    transacoes = [
+        schemas.TransactionCreate(description=f"t{i}", amount=i + 0.01, type="expense",
+                                  category=f"C{i % 3}", date=date(2025, 1 + i % 4, 1 + i))
+        for i in range(20)
+    ]
+    crud.create_transactions_batch(db, transacoes, user.id)
+    assert _rollups(db, user.id) == _raw_totals(db, user.id)
+
+
+def test_invalid_update_date_is_rejected_without_touching_rollups(client, db, user):
+    t = _tx(db, user.id, 10, date(2025, 5, 5))
+    antes = _rollups(db, user.id)
+    for data in (None, "05/05/2025", "amanhã"):
+        r = client.put(f"/transactions/{t.id}", headers=auth_headers(user), json={"date": data, "amount": 99})
+        assert r.status_code == 400, r.text
+    db.expire_all()
+    assert _rollups(db, user.id) == antes == _raw_totals(db, user.id)
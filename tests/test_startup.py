@@ -0,0 +1,24 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from backend import startup
+
+
+def _old_schema():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE transactions (id INTEGER PRIMARY KEY, user_id INTEGER, amount BIGINT)"))
+        conn.execute(text("CREATE TABLE monthly_rollups (id INTEGER PRIMARY KEY, total BIGINT)"))
+    return engine
+
+
+def test_current_schema_passes():
+    startup.check_migrations()
+
+
+def test_missing_migrations_are_named():
+    with pytest.raises(RuntimeError) as erro:
+        startup.check_migrations(_old_schema())
+    mensagem = str(erro.value)
+    for _tabela, nome, script in startup.MIGRATED_COLUMNS + startup.MIGRATED_INDEXES:
+        assert nome in mensagem and f"python -m {script}" in mensagem